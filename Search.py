@@ -1,99 +1,143 @@
+import argparse
 import os
-import datetime
 import pywikibot
-import concurrent.futures
 import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from tqdm import tqdm
 import time
+from cache import WikitextCache
+from dump import iter_dump_pages
+from index import SearchIndex
+from directory import WikiDirectory
+from journal import Journal
+from matcher import TermMatcher
+from pipeline import ResultWriter, bounded_map
 
-
-def file_updated_within_last_48_hours(filepath):
-    last_modified_time = datetime.datetime.fromtimestamp(os.path.getmtime(filepath))
-    current_time = datetime.datetime.now()
-    difference = current_time - last_modified_time
-    return difference.total_seconds() < (24 * 3600)
+COUNTRY_CODE_PATTERN = re.compile(r"/([a-z]{2}|pt-br|zh-hans|zh-hant)$", re.IGNORECASE)
 
 
 def check_and_prepare_page_list(site):
-    filepath = 'wiki_directory.txt'
-    if not (os.path.exists(filepath) and file_updated_within_last_48_hours(filepath)):
-        #exclude_namespaces = [-2, -1]
-        exclude_namespaces = [-2, -1, 2, 3, 6, 7, 8, 9]
-        with open(filepath, 'w', encoding='utf-8') as file:
-            for ns_id, ns_info in site.namespaces.items():
-                if ns_id in exclude_namespaces:
-                    continue
-                for page in site.allpages(namespace=ns_id, total=None, filterredir=False):
-                    file.write(f"{page.title()}\n")
-
+    # Replays recent changes since the last sync; falls back to a full allpages crawl when needed
+    directory = WikiDirectory()
+    directory.sync(site)
+    return directory
 
-def clear_search_results():
-    with open("search_results.txt", "w", encoding='utf-8') as file:
-        file.truncate()
 
+def in_scope(title, ns, namespaces, languages):
+    """Whether a title is in the selected namespaces and languages.
 
-def read_lines(filepath):
-    with open(filepath, 'r', encoding='utf-8') as file:
-        return [line.strip() for line in file]
+    languages is None to keep every language subpage, otherwise the set of
+    language codes whose subpages are kept (empty to skip them all).
+    """
+    if ns not in namespaces:
+        return False
+    match = COUNTRY_CODE_PATTERN.search(title)
+    return not match or languages is None or match.group(1).lower() in languages
 
 
-def write_lines(filepath, lines):
-    with open(filepath, 'w', encoding='utf-8') as file:
-        file.writelines(f"{line}\n" for line in lines)
+def searchable_titles(directory, namespaces, languages):
+    """Classify the directory up front so out-of-scope titles are never fetched."""
+    return sorted(title for title in directory.titles(namespaces)
+                  if in_scope(title, directory.pages[title]['ns'], namespaces, languages))
 
 
-def process_page(title, site, search_terms, case_sensitive, ignore_string, ignore_country_codes, country_code_pattern,
-                 search_terms_lower):
-    page = pywikibot.Page(site, title)
-    if page.namespace() != 0:  # Skip non-main namespaces
+def process_page(page, matcher):
+    if not page.exists:
         return None
-    if ignore_country_codes and country_code_pattern.search(page.title()):
+    if matcher.ignored(page.text):
         return None
-    page_text = page.text
-    if ignore_string:
-        if case_sensitive and ignore_string in page_text:
-            return None
-        elif not case_sensitive and ignore_string.lower() in page_text.lower():
-            return None
-
-    if case_sensitive:
-        if any(term in page_text for term in search_terms):
-            return page.title()
-    else:
-        page_text_lower = page_text.lower()
-        if any(term in page_text_lower for term in search_terms_lower):
-            return page.title()
-
+    if matcher.matches(page.text):
+        return page.title
     return None
 
 
-def search_in_body(site, search_terms, case_sensitive, ignore_string, ignore_country_codes, max_threads=80):
-    clear_search_results()
-    pages_to_search = read_lines("wiki_directory.txt")
+def search_in_body(site, directory, matcher, namespaces, languages, max_workers=4, resume=False):
+    # With resume, pages checked by the interrupted run are skipped and its results are kept
+    journal = Journal("search_journal.jsonl", resume=resume)
+    pages_to_search = [title for title in searchable_titles(directory, namespaces, languages)
+                       if not journal.has('checked', title)]
 
-    search_terms_lower = [term.lower() for term in search_terms]
-    country_code_pattern = re.compile(r"/([a-z]{2}|pt-br|zh-hans|zh-hant)$", re.IGNORECASE)
-
-    batch_results = []
+    cache = WikitextCache()
+    results = ResultWriter("search_results.txt", append=resume)
     progress_bar = tqdm(total=len(pages_to_search), desc="Processing pages")
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_threads) as executor:
-        futures = [
-            executor.submit(
-                process_page, title, site, search_terms, case_sensitive, ignore_string, ignore_country_codes,
-                country_code_pattern, search_terms_lower
-            ) for title in pages_to_search
-        ]
-        for future in concurrent.futures.as_completed(futures):
-            result = future.result()
-            if result:
-                batch_results.append(result)
-            progress_bar.update(1)
+    for page in cache.fetch_pages(site, pages_to_search, max_workers=max_workers):
+        result = process_page(page, matcher)
+        if result:
+            results.write(result)
+        journal.record('checked', page.title, page.revid)
+        progress_bar.update(1)
 
     progress_bar.close()
+    cache.close()
+    results.close()
+    journal.close()
+
+
+def search_index(site, directory, matcher, namespaces, languages, refresh=True, max_workers=4):
+    """Answer a search from the token index, verifying only the candidate pages.
+
+    With refresh, changed pages are first pulled into the cache (a cheap
+    prop=info check per batch). Without it no request is made at all.
+    """
+    pages_to_search = searchable_titles(directory, namespaces, languages)
+
+    cache = WikitextCache()
+    index = SearchIndex()
+    if refresh:
+        cache.refresh(site, pages_to_search, max_workers=max_workers)
+    index.update(cache)
+
+    titles = None if matcher.regex else index.candidates(matcher.terms)
+    if titles is None:
+        titles = pages_to_search
+    else:
+        searchable = set(pages_to_search)
+        titles = [title for title in titles if title in searchable]
+
+    revisions = cache.revisions()
+    results = ResultWriter("search_results.txt")
+    for title in tqdm(titles, desc="Verifying candidates"):
+        page = cache.get(title, revisions[title]) if title in revisions else None
+        if page and process_page(page, matcher):
+            results.write(page.title)
+
+    index.close()
+    cache.close()
+    results.close()
+
 
-    batch_results.sort()
-    write_lines("search_results.txt", batch_results)
+dump_worker_args = None
+
+
+def init_dump_worker(*args):
+    global dump_worker_args
+    dump_worker_args = args
+
+
+def process_dump_chunk(pages):
+    return len(pages), [title for title in (process_page(page, *dump_worker_args) for page in pages) if title]
+
+
+def search_dump(dump_path, matcher, namespaces, languages, processes=None, chunk_size=64):
+    # Filtered here so out-of-scope pages are never shipped to the workers
+    pages = (page for page in iter_dump_pages(dump_path) if in_scope(page.title, page.ns, namespaces, languages))
+    chunks = iter(lambda: list(islice(pages, chunk_size)), [])
+
+    results = ResultWriter("search_results.txt")
+    progress_bar = tqdm(desc="Processing pages", unit=" pages")
+    workers = processes or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_dump_worker, initargs=(matcher,)) as executor:
+        # Only a couple of chunks per worker are in flight, so the dump is never held in memory
+        for count, titles in bounded_map(executor, process_dump_chunk, chunks, 2 * workers):
+            for title in titles:
+                results.write(title)
+            progress_bar.update(count)
+
+    progress_bar.close()
+    results.close()
 
 
 def login_to_site():
@@ -123,19 +167,66 @@ def get_user_input(prompt, valid_responses=None, default=None):
 
 
 def main():
-    site = login_to_site()
-    if not site:
-        return
-
-    check_and_prepare_page_list(site)
+    parser = argparse.ArgumentParser(description="Search the body text of every wiki page.")
+    parser.add_argument('--dump', help="search a Special:Export XML dump (.xml, .xml.bz2 or .xml.gz) instead of "
+                                       "fetching from the wiki")
+    parser.add_argument('--processes', type=int, default=None,
+                        help="worker processes used with --dump (default: one per CPU)")
+    parser.add_argument('--namespaces', default='0',
+                        help="comma-separated namespace IDs to search (default: 0)")
+    parser.add_argument('--languages',
+                        help="language subpages to search: 'all', 'none' or comma-separated codes such as fr,pt-br "
+                             "(default: ask)")
+    parser.add_argument('--index', action='store_true',
+                        help="answer the search from the local token index over cached page text")
+    parser.add_argument('--no-refresh', action='store_true',
+                        help="with --index, search the cache as it is without contacting the wiki")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue an interrupted live search (same terms) instead of starting over; "
+                             "not with --index or --dump, which always write search_results.txt afresh")
+    args = parser.parse_args()
+    if args.resume and (args.index or args.dump):
+        parser.error("--resume only applies to live searches, not to --index or --dump")
+    namespaces = {int(ns) for ns in args.namespaces.split(',')}
+
+    site = None
+    directory = None
+    if not args.dump and not (args.index and args.no_refresh):
+        site = login_to_site()
+        if not site:
+            return
+
+        directory = check_and_prepare_page_list(site)
+    elif not args.dump:
+        directory = WikiDirectory()  # Searching offline, so the directory is used as last synced
 
     search_terms_input = get_user_input("Enter the texts to search for in the body, separated by commas: ")
-    search_terms = [term.strip() for term in search_terms_input.split(',')]
-    ignore_string = get_user_input("Enter a string to ignore in pages (leave blank to ignore none): ")
-    ignore_country_codes = get_user_input("Ignore language pages? (Y/N) [default: Y]: ", {"Y", "N"}, default="Y") == 'Y'
+    search_terms = [term.strip() for term in search_terms_input.split(',') if term.strip()]
+    ignore_input = get_user_input("Enter strings to ignore in pages, separated by commas (leave blank to ignore none): ")
+    ignore_strings = [string.strip() for string in ignore_input.split(',') if string.strip()]
+    if args.languages is None:
+        ignore_country_codes = get_user_input("Ignore language pages? (Y/N) [default: Y]: ", {"Y", "N"},
+                                              default="Y") == 'Y'
+        languages = set() if ignore_country_codes else None
+    elif args.languages.lower() == 'all':
+        languages = None
+    elif args.languages.lower() == 'none':
+        languages = set()
+    else:
+        languages = {code.strip().lower() for code in args.languages.split(',')}
     case_sensitive = get_user_input("Case sensitive search? (Y/N) [default: N]: ", {"Y", "N"}, default="N") == 'N'
-
-    search_in_body(site, search_terms, case_sensitive, ignore_string, ignore_country_codes)
+    regex = get_user_input("Treat search and ignore texts as regular expressions? (Y/N) [default: N]: ", {"Y", "N"},
+                           default="N") == 'Y'
+    whole_words = get_user_input("Match whole words only? (Y/N) [default: N]: ", {"Y", "N"}, default="N") == 'Y'
+
+    matcher = TermMatcher(search_terms, case_sensitive=case_sensitive, regex=regex, whole_words=whole_words,
+                          ignore=ignore_strings)
+    if args.dump:
+        search_dump(args.dump, matcher, namespaces, languages, args.processes)
+    elif args.index:
+        search_index(site, directory, matcher, namespaces, languages, refresh=not args.no_refresh)
+    else:
+        search_in_body(site, directory, matcher, namespaces, languages, resume=args.resume)
 
 
 if __name__ == "__main__":
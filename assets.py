@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+from snippets import SnippetStore
+
+
+class FileCache:
+    """Thread-safe LRU cache of file contents, keyed by path.
+
+    A cached file is re-read when its mtime or size changes, but that is only
+    checked once recheck_after seconds have passed since the last check, so a
+    hot file costs no I/O at all. Missing files are cached as None the same
+    way.
+    """
+
+    def __init__(self, max_entries=4096, recheck_after=2.0):
+        self.max_entries = max_entries
+        self.recheck_after = recheck_after
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # path -> (signature, checked_at, value)
+
+    def _signature(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, path, load):
+        """Return load(path) for an existing file, or None, loading it again only after it changed."""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None:
+                self.entries.move_to_end(path)
+                if now - entry[1] < self.recheck_after:
+                    return entry[2]
+
+            signature = self._signature(path)
+            if entry is not None and entry[0] == signature:
+                self.entries[path] = (signature, now, entry[2])
+                return entry[2]
+            try:
+                value = None if signature is None else load(path)
+            except FileNotFoundError:
+                value = None
+            self.entries[path] = (signature, now, value)
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            return value
+
+    def read(self, path, encoding=None):
+        def load(path):
+            with open(path, 'r', encoding=encoding) as file:
+                return file.read()
+        return self.get(path, load)
+
+
+class InfoboxIndex:
+    """Sorted index of the generated infobox files under a directory, built with a single walk.
+
+    Files are looked up by exact item ID (the file name without its
+    extension). With prefix_fallback, an ID that has no file of its own
+    falls back to the first file name starting with it, as the old
+    directory scan did.
+    """
+
+    def __init__(self, directory, prefix_fallback=False):
+        self.prefix_fallback = prefix_fallback
+        entries = sorted((name, os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+        self.names = [name for name, _ in entries]
+        self.paths = [path for _, path in entries]
+        self.exact = {}
+        for name, path in entries:
+            self.exact.setdefault(os.path.splitext(name)[0], path)
+
+    def __len__(self):
+        return len(self.names)
+
+    def find(self, item_id):
+        """Path of the infobox file for an item ID, or None."""
+        if not item_id:
+            return None
+        path = self.exact.get(item_id)
+        if path is None and self.prefix_fallback:
+            position = bisect_left(self.names, item_id)
+            if position < len(self.names) and self.names[position].startswith(item_id):
+                path = self.paths[position]
+        return path
+
+
+class DistroStore:
+    """Distribution tables written by pz-distribution-to-wikitable, indexed with a single directory listing.
+
+    Tables are looked up by BOT FLAG key (the file name without .txt),
+    ignoring case like a file name check on Windows,
+    and read through the shared FileCache, so each one is loaded from disk once.
+    Files added to the directory during a run are not picked up.
+    """
+
+    def __init__(self, directory, files):
+        self.files = files
+        self.paths = {}
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            key, extension = os.path.splitext(entry.name)
+            if extension.casefold() == '.txt' and entry.is_file():
+                self.paths.setdefault(key.casefold(), entry.path)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def get(self, flag_key):
+        path = self.paths.get(flag_key.casefold())
+        return self.files.read(path, encoding='utf-8') if path else None
+
+
+class AssetContext:
+    """The files an updater run reads for every article, loaded once and shared by all threads.
+
+    Covers the infobox blacklist, the generated infobox files, the
+    distribution tables substituted into BOT FLAG sections and the CodeSnip
+    store written by codebox.py.
+    """
+
+    def __init__(self, distro_dir, infobox_dir=None, blacklist_path='infobox_blacklist.txt',
+                 snippet_path='snippets.sqlite3', prefix_fallback=False, max_files=4096, recheck_after=2.0):
+        self.blacklist_path = blacklist_path
+        self.snippet_path = snippet_path
+        self.files = FileCache(max_files, recheck_after)
+        self.distros = DistroStore(distro_dir, self.files)
+        self.infoboxes = InfoboxIndex(infobox_dir, prefix_fallback) if infobox_dir else None
+
+    def blacklist(self):
+        def load(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return frozenset(line.strip() for line in f)
+        return self.files.get(self.blacklist_path, load) or frozenset()
+
+    def infobox(self, item_id):
+        """Generated infobox text for an item ID, or None if there is no file for it."""
+        path = self.infoboxes.find(item_id) if self.infoboxes else None
+        return self.files.read(path, encoding='utf-8') if path else None
+
+    def distro(self, flag_key):
+        """Distribution table for a BOT FLAG key, or None if there is no file for it."""
+        return self.distros.get(flag_key)
+
+    def snippet(self, name):
+        """CodeSnip text saved for an item, or None if there is none."""
+        def load(path):
+            store = SnippetStore(path)
+            try:
+                return store.load()
+            finally:
+                store.close()
+        snippets = self.files.get(self.snippet_path, load)
+        return snippets.get(name) if snippets else None
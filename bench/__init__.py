@@ -0,0 +1,5 @@
+"""Benchmarks for the scripts' hot paths; run with python -m bench from the repository root.
+
+python -m bench.check_format compares wikiformat.format_wikitext against the golden pages in format_corpus.
+python -m bench.check_items checks the item headers itemparser.iter_items recognises.
+"""
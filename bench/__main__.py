@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+# The scripts import pywikibot at module level; the benchmarks never log in
+os.environ.setdefault('PYWIKIBOT_NO_USER_CONFIG', '2')
+
+import codebox
+import updater
+from assets import AssetContext
+from Search import process_page
+from bench.corpus import Corpus
+from bench.fakesite import FakeSite
+from fetcher import fetch_pages
+from infobox import parse_parameters, rank, serialize
+from itemparser import iter_items
+from matcher import TermMatcher
+from pagemodel import PageModel
+from pipeline import Spool
+from snippets import SnippetStore
+from wikiformat import format_wikitext
+
+VERSION = "41.78.16"
+SEARCH_TERMS = ['Base.Item7', 'generator', 'fuel', 'armystorage', 'Property19 = key', 'shotgun ammo', 'Navbox items',
+                'CodeSnip', 'icon_name6', 'Wardrobe', 'canned soup', 'Base.Item199', 'battery radio', 'gloves',
+                'bandage pills', 'chance', 'lore', 'vhs', 'plank nails', 'rifle']
+WARMUP = 5
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentile(timings, fraction):
+    return timings[min(len(timings) - 1, round(fraction * (len(timings) - 1)))]
+
+
+def run_case(make_operations, repeat):
+    """Time every operation; each is (function, args, items processed)."""
+    for function, args, _ in make_operations()[:WARMUP]:
+        function(*args)
+    timings = []
+    items = 0
+    for _ in range(repeat):
+        for function, args, count in make_operations():
+            start = perf_counter()
+            function(*args)
+            timings.append(perf_counter() - start)
+            items += count
+    total = sum(timings)
+    timings.sort()
+    return {
+        'ops': len(timings),
+        'items': items,
+        'seconds': round(total, 6),
+        'items_per_sec': round(items / total, 2) if total else None,
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 4),
+        'p90_ms': round(percentile(timings, 0.9) * 1000, 4),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 4),
+        'max_ms': round(timings[-1] * 1000, 4),
+    }
+
+
+def rank_keys(keys):
+    for key in keys:
+        rank(key)
+
+
+def parse_items(path):
+    with open(path, 'r') as file:
+        for _ in iter_items(file):
+            pass
+
+
+def build_cases(corpus, directories, latency, workers):
+    pages = corpus.pages
+    assets = AssetContext(directories['distributions'], infobox_dir=directories['infoboxes'])
+    infoboxes = [PageModel(page.text).infobox.text for page in pages]
+    infobox_lines = [infobox.split('\n') for infobox in infoboxes]
+    parameters = [parse_parameters(lines) for lines in infobox_lines]
+    current = []  # Page texts whose distribution tables already match the files
+    for page in pages:
+        model = PageModel(page.text)
+        updater.update_distro(model, assets)
+        current.append(model.text())
+    matcher = TermMatcher(SEARCH_TERMS)
+    resources = [os.path.join(directories['resources'], name) for name in sorted(corpus.resources)]
+    site = FakeSite(pages, latency=latency, high_limits=False)
+    titles = [page.title for page in pages]
+    spool = Spool(':memory:')
+    store = SnippetStore()
+    snippets = sorted(store.load().items())
+
+    def fetch_all():
+        for _ in fetch_pages(site, titles, max_workers=workers):
+            pass
+
+    return {
+        'Search.process_page': lambda: [(process_page, (page, matcher), 1) for page in pages],
+        'wikiformat.format_wikitext': lambda: [(format_wikitext, (page.text,), 1) for page in pages],
+        'pagemodel.PageModel': lambda: [(PageModel, (page.text,), 1) for page in pages],
+        'infobox.rank': lambda: [(rank_keys, (list(values),), len(values)) for values in parameters],
+        'infobox.parse_parameters': lambda: [(parse_parameters, (lines,), 1) for lines in infobox_lines],
+        'infobox.serialize': lambda: [(serialize, (values,), 1) for values in parameters],
+        'updater.sort_infobox': lambda: [(updater.sort_infobox, (infobox,), 1) for infobox in infoboxes],
+        'updater.process_infobox': lambda: [
+            (updater.process_infobox, (PageModel(page.text), page.title, assets), 1) for page in pages
+        ],
+        'updater.update_distro': lambda: [(updater.update_distro, (PageModel(page.text), assets), 1) for page in pages],
+        'updater.update_distro_current': lambda: [
+            (updater.update_distro, (PageModel(text), assets), 1) for text in current
+        ],
+        'updater.process_codebox': lambda: [
+            (updater.process_codebox, (PageModel(page.text), page.title, assets), 1) for page in pages
+        ],
+        'updater.check_and_queue': lambda: [
+            (updater.check_and_queue, (page, spool, assets), 1) for page in pages
+        ],
+        'itemparser.iter_items': lambda: [(parse_items, (path,), 1) for path in resources],
+        'codebox.process_file': lambda: [(codebox.process_file, (path, VERSION), 1) for path in resources],
+        'snippets.put_many': lambda: [(store.put_many, (snippets,), len(snippets))],
+        'fetcher.fetch_pages': lambda: [(fetch_all, (), len(titles))],
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    print(f"\nAgainst {baseline.get('commit') or baseline_path}:")
+    for name, result in results['cases'].items():
+        old = baseline.get('cases', {}).get(name)
+        if not old or not old.get('items_per_sec') or not result['items_per_sec']:
+            print(f"  {name:<30} no baseline")
+            continue
+        print(f"  {name:<30} {result['items_per_sec'] / old['items_per_sec']:6.2f}x throughput, "
+              f"p50 {old['p50_ms']:.3f} -> {result['p50_ms']:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bench', description="Benchmark the scripts' hot paths on a "
+                                                                        "synthetic corpus.")
+    parser.add_argument('--pages', type=int, default=200, help="number of synthetic item pages (default: 200)")
+    parser.add_argument('--seed', type=int, default=0, help="corpus seed (default: 0)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed passes over the corpus per case (default: 3)")
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help="seconds the fake site waits per API request (default: 0.05)")
+    parser.add_argument('--workers', type=int, default=4, help="fetch threads for fetcher.fetch_pages (default: 4)")
+    parser.add_argument('--cases', help="comma-separated substrings selecting the cases to run (default: all)")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.compare) if args.compare else None
+
+    corpus = Corpus(args.pages, args.seed)
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='pwb-bench-')
+    try:
+        directories = corpus.write(workdir)
+        # The scripts read and write the snippet store and their report files relative to the working directory
+        os.chdir(workdir)
+        store = SnippetStore()
+        for name in corpus.resources:
+            snippets = codebox.process_file(os.path.join(directories['resources'], name), VERSION)
+            store.put_many([(snippet_name, text) for snippet_name, text, _ in snippets])
+        store.close()
+
+        cases = build_cases(corpus, directories, args.latency, args.workers)
+        if args.cases:
+            wanted = [name.strip() for name in args.cases.split(',')]
+            cases = {name: case for name, case in cases.items() if any(part in name for part in wanted)}
+
+        results = {'commit': git_commit(), 'python': platform.python_version(), 'pages': args.pages,
+                   'seed': args.seed, 'repeat': args.repeat, 'latency': args.latency, 'workers': args.workers,
+                   'corpus_bytes': sum(len(page.text.encode('utf-8')) for page in corpus.pages), 'cases': {}}
+        print(f"{'case':<30} {'items/s':>12} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10}")
+        for name, make_operations in cases.items():
+            result = run_case(make_operations, args.repeat)
+            results['cases'][name] = result
+            print(f"{name:<30} {result['items_per_sec'] or 0:>12.1f} {result['p50_ms']:>10.3f} "
+                  f"{result['p90_ms']:>10.3f} {result['p99_ms']:>10.3f}")
+            sys.stdout.flush()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    if baseline:
+        compare(results, baseline)
+
+
+if __name__ == '__main__':
+    main()
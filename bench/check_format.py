@@ -0,0 +1,46 @@
+import argparse
+import os
+import sys
+
+from wikiformat import format_wikitext
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'format_corpus')
+
+
+def read(path):
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        return file.read()
+
+
+def check(corpus=CORPUS):
+    """Names of the corpus pages whose formatted text differs from the stored expected output.
+
+    Every NAME.wiki page has a NAME.expected.wiki made by the formatter in
+    formatting.py before it was rewritten as wikiformat.format_wikitext.
+    """
+    failures = []
+    for name in sorted(os.listdir(corpus)):
+        if not name.endswith('.wiki') or name.endswith('.expected.wiki'):
+            continue
+        page = os.path.join(corpus, name)
+        expected = read(page[:-len('.wiki')] + '.expected.wiki')
+        if format_wikitext(read(page))[0] != expected:
+            failures.append(name)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bench.check_format',
+                                     description="Compare format_wikitext against the golden page corpus.")
+    parser.add_argument('--corpus', default=CORPUS, help="directory of NAME.wiki and NAME.expected.wiki files")
+    args = parser.parse_args()
+    failures = check(args.corpus)
+    for name in failures:
+        print(f"FAIL {name}")
+    pages = sum(1 for name in os.listdir(args.corpus) if name.endswith('.expected.wiki'))
+    print(f"{pages - len(failures)} of {pages} pages match")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import sys
+
+from itemparser import iter_items
+
+# Item headers written the ways the game's script files write them, with the (name, line) each must give
+SCRIPT = """module Base
+{
+    item Axe
+    {
+        Weight = 3,
+    }
+    item Saw // handsaw
+    {
+        Weight = 1, /* { not a brace */
+    }
+    item Knife { // kitchen knife
+        Weight = 0.5,
+    }
+    item Hammer /* claw hammer
+       spanning lines { */
+    {
+        Weight = 1,
+    }
+    item Pipe/* lead pipe */{
+        Weight = 2,
+    }
+    /* item Commented
+    { */
+}
+"""
+EXPECTED = [('Axe', 3), ('Saw', 7), ('Knife', 11), ('Hammer', 14), ('Pipe', 19)]
+
+
+def check():
+    """(name, line) pairs iter_items finds in SCRIPT, and whether they are the expected ones."""
+    found = [(name, line) for name, line, _ in iter_items(SCRIPT.splitlines(True))]
+    return found, found == EXPECTED
+
+
+def main():
+    found, ok = check()
+    if not ok:
+        print(f"FAIL expected {EXPECTED}, found {found}")
+    print(f"{len(found)} items found, {len(EXPECTED)} expected")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+import os
+import random
+
+from fetcher import WikiPage
+from infobox import SORT_ORDER
+
+WORDS = ['axe', 'plank', 'nails', 'hammer', 'saw', 'bandage', 'pills', 'rifle', 'shotgun', 'ammo', 'water', 'bottle',
+         'canned', 'soup', 'bag', 'jacket', 'boots', 'gloves', 'battery', 'radio', 'generator', 'fuel', 'map', 'key']
+CONTAINERS = ['Crate', 'Shelves', 'Counter', 'Fridge', 'Locker', 'Wardrobe', 'Desk', 'Dresser', 'Bin', 'Toolbox']
+ROOMS = ['kitchen', 'garage', 'bedroom', 'storage', 'office', 'warehouse', 'classroom', 'bathroom', 'armystorage']
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def item_name(index):
+    return f"Item{index}"
+
+
+def item_id(index):
+    return f"Base.{item_name(index)}"
+
+
+def infobox_values(rng, index, models=6):
+    """Infobox keys and values for an item, with several numbered model/icon groups."""
+    values = {'|name': item_name(index), '|item_id': item_id(index)}
+    for number in range(1, models + 1):
+        suffix = '' if number == 1 else str(number)
+        values[f'|model{suffix}'] = f'{item_name(index)}_{number}.png'
+        values[f'|icon{suffix}'] = f'{item_name(index)}_icon_{number}.png'
+        values[f'|icon_name{suffix}'] = f'{item_name(index)} {number}'
+    for key in rng.sample(SORT_ORDER, 45):
+        values.setdefault(key, str(rng.randint(0, 100)))
+    for extra in range(rng.randint(0, 4)):
+        values[f'|custom_{extra}'] = rng.choice(WORDS)
+    return values
+
+
+def infobox_text(rng, values):
+    lines = [f'{key}={value}' for key, value in values.items()]
+    rng.shuffle(lines)
+    return '{{Infobox item\n' + '\n'.join(lines) + '\n}}'
+
+
+def distro_table(rng, rows):
+    """A distribution wikitable of roughly rows * 40 bytes."""
+    lines = ['{| class="wikitable sortable"', '! Building / Room !! Container !! Rolls !! Chance']
+    for _ in range(rows):
+        lines.append('|-')
+        lines.append(f'| {rng.choice(ROOMS)} || {rng.choice(CONTAINERS)} || {rng.randint(1, 8)} || '
+                     f'{rng.random() * 10:.2f}%')
+    lines.append('|}')
+    return '\n'.join(lines)
+
+
+def code_item(rng, name, properties=12):
+    lines = [f'    item {name}', '    {']
+    for number in range(properties):
+        lines.append(f'        Property{number} = {rng.choice(WORDS)},')
+    lines.append('    }')
+    return lines
+
+
+def resource_text(rng, first, count):
+    lines = ['module Base', '{', '    imports', '    {', '        Base', '    }', '']
+    for index in range(first, first + count):
+        lines.extend(code_item(rng, item_name(index), rng.randint(6, 20)))
+        lines.append('')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def codesnip(index):
+    # Stale on purpose, so process_codebox finds a replacement on disk
+    return (f'{{{{CodeSnip\n  | lang = java\n  | line = true\n  | start = 1\n  | source = items.txt\n'
+            f'  | retrieved = true\n  | version = 41.0\n  | code =\nitem {item_name(index)}\n}}}}')
+
+
+def page_text(rng, index, items, codesnips=8, distro_sections=2, table_rows=0):
+    """Wikitext of an item article with the structures the scripts rewrite."""
+    parts = [infobox_text(rng, infobox_values(rng, index)), '', sentence(rng, 30) + '  ', '',
+             '==Usage==', '', sentence(rng, 40), '===Crafting===', sentence(rng, 20), '']
+    for _ in range(rng.randint(2, 6)):
+        parts.extend([f'=={rng.choice(WORDS).capitalize()}==', sentence(rng, rng.randint(10, 60)) + '   ', '', ''])
+    parts.append('==Distribution==')
+    for section in range(distro_sections):
+        key = f'{item_name(index)}_{section}'
+        parts.append(f'<!--BOT FLAG|{key}|{section}-->\n{distro_table(rng, 20)}\n<!--END BOT FLAG|{key}|{section}-->')
+    if table_rows:
+        parts.extend(['==Locations==', distro_table(rng, table_rows)])
+    parts.append('==Code==')
+    for other in rng.sample(range(items), min(codesnips, items)):
+        parts.append(codesnip(other))
+    parts.extend(['==See also==', '* [[' + item_name(rng.randrange(items)) + ']]', '{{Navbox items}}', ''])
+    return '\n'.join(parts)
+
+
+class Corpus:
+    """Deterministic synthetic wiki pages and game resource files for the benchmarks.
+
+    Every page is an item article with a large infobox, several CodeSnip
+    blocks and BOT FLAG distribution sections. One page in ten also carries
+    a location table of 100 KB or more. The same seed always gives the same
+    corpus, so results stay comparable across commits.
+    """
+
+    def __init__(self, pages=200, seed=0):
+        rng = random.Random(seed)
+        self.seed = seed
+        self.pages = []
+        for index in range(pages):
+            rows = 2600 if index % 10 == 0 else 0
+            self.pages.append(WikiPage(item_name(index), 0, index + 1, index + 1, '2024-01-01T00:00:00Z',
+                                       page_text(rng, index, pages, table_rows=rows)))
+        self.infoboxes = {item_id(index): infobox_values(rng, index) for index in range(pages)}
+        self.distros = {f'{item_name(index)}_{section}': distro_table(rng, 40)
+                        for index in range(pages) for section in range(2)}
+        self.resources = {f'items_{first // 25}.txt': resource_text(rng, first, min(25, pages - first))
+                          for first in range(0, pages, 25)}
+
+    def write(self, root):
+        """Write the infobox, distribution and resource files under root; returns their directories."""
+        directories = {name: os.path.join(root, name) for name in ('infoboxes', 'distributions', 'resources')}
+        for path in directories.values():
+            os.makedirs(path, exist_ok=True)
+        for identifier, values in self.infoboxes.items():
+            with open(os.path.join(directories['infoboxes'], f'{identifier}.txt'), 'w', encoding='utf-8') as file:
+                file.write('\n'.join(f'{key}={value}' for key, value in values.items()))
+        for key, table in self.distros.items():
+            with open(os.path.join(directories['distributions'], f'{key}.txt'), 'w', encoding='utf-8') as file:
+                file.write(table)
+        for name, text in self.resources.items():
+            with open(os.path.join(directories['resources'], name), 'w', encoding='utf-8') as file:
+                file.write(text)
+        return directories
@@ -0,0 +1,48 @@
+import time
+
+
+class FakeRequest:
+    def __init__(self, site, params):
+        self.site = site
+        self.params = params
+
+    def submit(self):
+        return self.site.answer(self.params)
+
+
+class FakeSite:
+    """In-memory stand-in for pywikibot.Site that answers the queries fetcher and cache make.
+
+    Every request sleeps for latency seconds first, so concurrent fetching
+    can be measured as it would behave against a remote wiki.
+    """
+
+    def __init__(self, pages, latency=0.0, high_limits=True):
+        self.pages = {page.title: page for page in pages}
+        self.latency = latency
+        self.high_limits = high_limits
+        self.requests = 0
+
+    def has_right(self, right):
+        return right == 'apihighlimits' and self.high_limits
+
+    def simple_request(self, **params):
+        return FakeRequest(self, params)
+
+    def answer(self, params):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        result = []
+        for title in params['titles'].split('|'):
+            page = self.pages.get(title)
+            if page is None:
+                result.append({'title': title, 'ns': 0, 'missing': True})
+            elif params.get('prop') == 'info':
+                result.append({'title': title, 'ns': page.ns, 'pageid': page.pageid, 'lastrevid': page.revid})
+            else:
+                result.append({'title': title, 'ns': page.ns, 'pageid': page.pageid, 'revisions': [{
+                    'revid': page.revid, 'timestamp': page.timestamp,
+                    'slots': {'main': {'contentmodel': 'wikitext', 'content': page.text}},
+                }]})
+        return {'batchcomplete': True, 'query': {'pages': result}}
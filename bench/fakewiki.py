@@ -0,0 +1,791 @@
+"""A local stand-in for the MediaWiki action API.
+
+Serves an in-memory wiki over HTTP so pywikibot and the scripts in this
+repository can be run end to end without touching the live wiki. Latency,
+replication lag and rate-limit errors can be injected to exercise the
+throttling code.
+
+Start it with ``python -m bench.fakewiki`` and point pywikibot at it with
+a user-config.py such as::
+
+    family_files['fakewiki'] = 'http://127.0.0.1:8765/w/api.php'
+    family = 'fakewiki'
+    mylang = 'fakewiki'
+    usernames['fakewiki']['fakewiki'] = 'Bot'
+    password_file = 'user-password.py'   # containing ('Bot', 'secret')
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+NAMESPACES = {
+    -2: 'Media', -1: 'Special', 0: '', 1: 'Talk', 2: 'User', 3: 'User talk', 4: 'Project', 5: 'Project talk',
+    6: 'File', 7: 'File talk', 8: 'MediaWiki', 9: 'MediaWiki talk', 10: 'Template', 11: 'Template talk',
+    12: 'Help', 13: 'Help talk', 14: 'Category', 15: 'Category talk',
+}
+NAMESPACE_IDS = {name.lower(): ns_id for ns_id, name in NAMESPACES.items() if name}
+NAMESPACE_IDS['image'] = 6
+
+REDIRECT_PATTERN = re.compile(r'^\s*#REDIRECT\s*\[\[([^\]|#]+)(?:#([^\]|]*))?', re.IGNORECASE)
+FILE_LINK_PATTERN = re.compile(r'(?:\[\[\s*(?:File|Image)\s*:|(?:^|[|=\s])(?=[^|=\n]+\.(?:png|jpe?g|gif|svg)))'
+                               r'\s*([^|\[\]\n}]+\.(?:png|jpe?g|gif|svg))', re.IGNORECASE)
+
+
+RC_SHOW = ['!anon', '!autopatrolled', '!bot', '!minor', '!patrolled', '!redirect', 'anon', 'autopatrolled', 'bot',
+           'minor', 'patrolled', 'redirect', 'unpatrolled']
+
+# Module name -> (prefix, group, generator, parameters) for action=paraminfo
+QUERY_MODULES = {
+    'revisions': ('rv', 'prop', True, ['prop', 'slots', 'limit', 'start', 'end', 'dir', 'continue']),
+    'info': ('in', 'prop', False, ['prop', 'continue']),
+    'imageinfo': ('ii', 'prop', False, ['prop', 'limit', 'continue']),
+    'categoryinfo': ('ci', 'prop', False, ['continue']),
+    'pageprops': ('pp', 'prop', False, ['continue', 'prop']),
+    'allpages': ('ap', 'list', True, ['from', 'continue', 'namespace', 'filterredir', 'limit', 'prefix']),
+    'querypage': ('qp', 'list', True, ['page', 'offset', 'limit']),
+    'imageusage': ('iu', 'list', True, ['title', 'continue', 'namespace', 'filterredir', 'limit']),
+    'recentchanges': ('rc', 'list', True, ['start', 'end', 'dir', 'namespace', 'prop', 'type', 'limit',
+                                           'continue', ('show', RC_SHOW), 'user', 'excludeuser', 'tag', 'toponly']),
+    'logevents': ('le', 'list', False, ['prop', 'type', 'action', 'start', 'end', 'dir', 'limit', 'continue',
+                                        'namespace', 'title', 'user']),
+    'allredirects': ('ar', 'list', True, ['continue', 'from', 'namespace', 'prop', 'limit']),
+    'templates': ('tl', 'prop', True, ['namespace', 'limit', 'continue', 'templates', 'dir']),
+    'categories': ('cl', 'prop', True, ['prop', 'show', 'limit', 'continue', 'categories', 'dir']),
+    'langlinks': ('ll', 'prop', False, ['prop', 'lang', 'title', 'dir', 'inlanguagecode', 'limit', 'continue']),
+    'links': ('pl', 'prop', True, ['namespace', 'limit', 'continue', 'titles', 'dir']),
+    'siteinfo': ('si', 'meta', False, ['prop']),
+    'userinfo': ('ui', 'meta', False, ['prop']),
+    'tokens': ('', 'meta', False, ['type']),
+}
+ACTION_MODULES = {
+    'main': ('', 'action', False, ['action', 'format', 'maxlag', 'assert', 'maxage', 'smaxage', 'curtimestamp',
+                                   'errorformat', 'uselang', 'origin', 'servedby', 'requestid', 'responselanginfo',
+                                   'assertuser']),
+    'query': ('', 'action', False, ['prop', 'list', 'meta', 'generator', 'titles', 'pageids', 'revids', 'redirects',
+                                    'continue', 'indexpageids', 'export', 'converttitles', 'iwurl', 'rawcontinue']),
+    'paraminfo': ('', 'action', False, ['modules', 'helpformat']),
+    'edit': ('', 'action', False, ['title', 'pageid', 'section', 'text', 'summary', 'tags', 'minor', 'notminor',
+                                   'bot', 'baserevid', 'basetimestamp', 'starttimestamp', 'recreate', 'createonly',
+                                   'nocreate', 'watchlist', 'md5', 'contentformat', 'contentmodel', 'token',
+                                   'undo', 'undoafter', 'prependtext', 'appendtext']),
+    'login': ('lg', 'action', False, ['name', 'password', 'domain', 'token']),
+    'logout': ('', 'action', False, ['token']),
+}
+
+
+def module_info(path, name, spec):
+    prefix, group, generator, parameters = spec
+    info = {'name': name, 'classname': f'Api{name.title()}', 'path': path, 'group': group, 'prefix': prefix,
+            'source': 'MediaWiki', 'sourcename': 'mediawiki', 'licensetag': 'GPL-2.0-or-later',
+            'licenselink': '', 'readrights': True, 'helpurls': [], 'parameters': [], 'templatedparameters': []}
+    if generator:
+        info['generator'] = True
+    if name in ('edit', 'login', 'logout'):
+        info['mustbeposted'] = True
+        info['writerights'] = name == 'edit'
+        info['readrights'] = name != 'login'
+    for param in parameters:
+        if isinstance(param, tuple):
+            param, values = param
+            info['parameters'].append({'index': len(info['parameters']) + 1, 'name': param, 'type': values,
+                                       'multi': True, 'limit': 50, 'lowlimit': 50, 'highlimit': 500})
+            continue
+        entry = {'index': len(info['parameters']) + 1, 'name': param, 'type': 'string'}
+        if param == 'limit':
+            entry.update({'type': 'limit', 'min': 1, 'max': 500, 'highmax': 5000, 'default': 10})
+        elif path == 'main' and param == 'action':
+            entry['type'] = sorted(ACTION_MODULES.keys() - {'main'})
+            entry['submodules'] = {module: module for module in entry['type']}
+        elif path == 'main' and param == 'format':
+            entry['type'] = ['json']
+        elif path == 'query' and param in ('prop', 'list', 'meta'):
+            names = sorted(n for n, s in QUERY_MODULES.items() if s[1] == param)
+            entry.update({'type': names, 'multi': True, 'limit': 50, 'lowlimit': 50, 'highlimit': 500,
+                          'submodules': {n: f'query+{n}' for n in names}})
+        elif path == 'query' and param == 'generator':
+            names = sorted(n for n, s in QUERY_MODULES.items() if s[2])
+            entry.update({'type': names, 'submodules': {n: f'query+{n}' for n in names}})
+        elif param in ('titles', 'pageids', 'revids'):
+            entry.update({'multi': True, 'limit': 50, 'lowlimit': 50, 'highlimit': 500})
+        info['parameters'].append(entry)
+    return info
+
+
+def timestamp(when=None):
+    when = when or datetime.datetime.now(datetime.timezone.utc)
+    return when.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class ApiError(Exception):
+    def __init__(self, code, info, retry_after=None):
+        super().__init__(info)
+        self.code = code
+        self.info = info
+        self.retry_after = retry_after
+
+
+class FakeWiki:
+    """In-memory wiki state shared by all request handler threads."""
+
+    def __init__(self, latency=0.0, lag=0.0, edit_rate=None, high_limits=False, username='Bot'):
+        self.lock = threading.RLock()
+        self.latency = latency
+        self.lag = lag
+        self.edit_rate = edit_rate  # (hits, seconds) or None
+        self.high_limits = high_limits
+        self.username = username
+        self.pages = {}
+        self.revisions = {}
+        self.recent_changes = []
+        self.edit_times = []
+        self.next_pageid = 1
+        self.next_revid = 1
+        self.next_rcid = 1
+        self.next_logid = 1
+        self.trace = False
+        self.stats = {'requests': 0, 'edits': 0, 'maxlag': 0, 'ratelimited': 0, 'editconflict': 0}
+
+    # --- titles -------------------------------------------------------
+
+    def split_title(self, title):
+        title = title.replace('_', ' ').strip()
+        namespace = 0
+        if ':' in title:
+            prefix, rest = title.split(':', 1)
+            ns_id = NAMESPACE_IDS.get(prefix.strip().lower())
+            if ns_id is not None:
+                namespace, title = ns_id, rest.strip()
+        if title:
+            title = title[0].upper() + title[1:]
+        return namespace, title
+
+    def normalize(self, title):
+        namespace, title = self.split_title(title)
+        return f'{NAMESPACES[namespace]}:{title}' if namespace else title
+
+    # --- content ------------------------------------------------------
+
+    def add_page(self, title, text, user=None, comment='', log=True):
+        """Create or edit a page directly, without going through the API."""
+        with self.lock:
+            return self._write(self.normalize(title), text, user or self.username, comment, log)
+
+    def _write(self, title, text, user, comment, log=True):
+        now = timestamp()
+        page = self.pages.get(title)
+        is_new = page is None
+        if is_new:
+            namespace, _ = self.split_title(title)
+            page = {'pageid': self.next_pageid, 'ns': namespace, 'title': title, 'revs': []}
+            self.next_pageid += 1
+            self.pages[title] = page
+        parent = page['revs'][-1] if page['revs'] else 0
+        revid = self.next_revid
+        self.next_revid += 1
+        self.revisions[revid] = {'revid': revid, 'parentid': parent, 'user': user, 'timestamp': now,
+                                 'comment': comment, 'text': text, 'title': title}
+        page['revs'].append(revid)
+        if log:
+            self._record_change('new' if is_new else 'edit', page, revid=revid, old_revid=parent)
+        return page
+
+    def delete_page(self, title):
+        with self.lock:
+            page = self.pages.pop(self.normalize(title))
+            self._record_change('log', page, logtype='delete', logaction='delete')
+
+    def move_page(self, title, new_title, leave_redirect=True):
+        with self.lock:
+            page = self.pages.pop(self.normalize(title))
+            old_title = page['title']
+            new_title = self.normalize(new_title)
+            page['title'] = new_title
+            page['ns'] = self.split_title(new_title)[0]
+            self.pages[new_title] = page
+            params = {'target_ns': page['ns'], 'target_title': new_title}
+            if not leave_redirect:
+                params['suppressredirect'] = True
+            entry = dict(page, title=old_title, ns=self.split_title(old_title)[0])
+            self._record_change('log', entry, logtype='move', logaction='move', logparams=params)
+            if leave_redirect:
+                self._write(old_title, f'#REDIRECT [[{new_title}]]', self.username, '', log=False)
+
+    def _record_change(self, change_type, page, revid=0, old_revid=0, logtype=None, logaction=None,
+                       logparams=None):
+        entry = {'type': change_type, 'ns': page['ns'], 'title': page['title'], 'pageid': page['pageid'],
+                 'revid': revid, 'old_revid': old_revid, 'rcid': self.next_rcid, 'timestamp': timestamp(),
+                 'user': self.username, 'comment': ''}
+        self.next_rcid += 1
+        if change_type == 'log':
+            entry.update({'logid': self.next_logid, 'logtype': logtype, 'logaction': logaction,
+                          'logparams': logparams or {}})
+            self.next_logid += 1
+        self.recent_changes.append(entry)
+
+    def latest(self, page):
+        return self.revisions[page['revs'][-1]]
+
+    def redirect_target(self, page):
+        match = REDIRECT_PATTERN.match(self.latest(page)['text'])
+        if match:
+            return self.normalize(match.group(1)), match.group(2) or ''
+        return None
+
+    # --- request handling ---------------------------------------------
+
+    def handle(self, params):
+        self.stats['requests'] += 1
+        if self.trace:
+            print(params, flush=True)
+        if self.latency:
+            time.sleep(self.latency)
+        if 'maxlag' in params and self.lag > float(params['maxlag']):
+            self.stats['maxlag'] += 1
+            raise ApiError('maxlag', f'Waiting for 127.0.0.1: {self.lag} seconds lagged.',
+                           retry_after=max(1, int(self.lag)))
+        action = params.get('action', 'query')
+        handler = getattr(self, f'action_{action}', None)
+        if handler is None:
+            raise ApiError('badvalue', f'Unrecognized value for parameter "action": {action}.')
+        with self.lock:
+            return handler(params)
+
+    def limit(self, params, name, default=10):
+        maximum = 5000 if self.high_limits else 500
+        value = params.get(name, default)
+        return maximum if value == 'max' else min(int(value), maximum)
+
+    def fv2(self, params):
+        return params.get('formatversion') == '2'
+
+    def action_paraminfo(self, params):
+        modules = []
+        for path in params.get('modules', '').split('|'):
+            if path.startswith('query+'):
+                name = path[len('query+'):]
+                spec = QUERY_MODULES.get(name)
+            else:
+                name = path
+                spec = ACTION_MODULES.get(name)
+            if spec is None:
+                continue
+            modules.append(module_info(path, name, spec))
+        return {'paraminfo': {'modules': modules}}
+
+    def action_login(self, params):
+        if params.get('lgtoken') != 'fakelogin+\\':
+            return {'login': {'result': 'NeedToken', 'token': 'fakelogin+\\'}}
+        self.username = params.get('lgname', self.username).split('@')[0]
+        return {'login': {'result': 'Success', 'lguserid': 1, 'lgusername': self.username}}
+
+    def action_logout(self, params):
+        return {}
+
+    def action_edit(self, params):
+        if params.get('token') != 'fakecsrf+\\':
+            raise ApiError('badtoken', 'Invalid CSRF token.')
+        if self.edit_rate:
+            hits, seconds = self.edit_rate
+            now = time.monotonic()
+            self.edit_times = [t for t in self.edit_times if now - t < seconds]
+            if len(self.edit_times) >= hits:
+                self.stats['ratelimited'] += 1
+                raise ApiError('ratelimited', "As an anti-abuse measure, you are limited from performing this "
+                                              "action too many times in a short space of time.")
+            self.edit_times.append(now)
+        title = self.normalize(params['title'])
+        page = self.pages.get(title)
+        if page is None and params.get('nocreate'):
+            raise ApiError('missingtitle', "The page you specified doesn't exist.")
+        if page is not None and params.get('createonly'):
+            raise ApiError('articleexists', 'The article you tried to create has been created already.')
+        if page is not None:
+            latest = self.latest(page)
+            base_revid = params.get('baserevid')
+            base_timestamp = params.get('basetimestamp')
+            if (base_revid and int(base_revid) != latest['revid']) or \
+                    (base_timestamp and base_timestamp < latest['timestamp']):
+                self.stats['editconflict'] += 1
+                raise ApiError('editconflict', 'Edit conflict detected.')
+            if latest['text'] == params.get('text', ''):
+                return {'edit': {'result': 'Success', 'pageid': page['pageid'], 'title': title,
+                                 'contentmodel': 'wikitext', 'nochange': True}}
+            old_revid = latest['revid']
+        else:
+            old_revid = 0
+        page = self._write(title, params.get('text', ''), self.username, params.get('summary', ''))
+        self.stats['edits'] += 1
+        latest = self.latest(page)
+        result = {'result': 'Success', 'pageid': page['pageid'], 'title': title, 'contentmodel': 'wikitext',
+                  'oldrevid': old_revid, 'newrevid': latest['revid'], 'newtimestamp': latest['timestamp']}
+        if old_revid == 0:
+            result['new'] = True
+        return {'edit': result}
+
+    def action_query(self, params):
+        result = {}
+        query = {}
+        continuation = {}
+        for meta in filter(None, params.get('meta', '').split('|')):
+            getattr(self, f'meta_{meta}')(params, query)
+        for module in filter(None, params.get('list', '').split('|')):
+            getattr(self, f'list_{module}')(params, query, continuation)
+        titles = None
+        if 'generator' in params:
+            titles = getattr(self, f'generator_{params["generator"]}')(params, continuation)
+        elif 'titles' in params:
+            titles = params['titles'].split('|')
+        elif 'pageids' in params:
+            by_id = {page['pageid']: title for title, page in self.pages.items()}
+            titles = [by_id.get(int(pageid), f'#{pageid}') for pageid in params['pageids'].split('|')]
+        elif 'revids' in params:
+            titles = [self.revisions[int(revid)]['title'] for revid in params['revids'].split('|')
+                      if int(revid) in self.revisions]
+        if titles is not None:
+            self.pageset(params, titles, query, continuation)
+        if query:
+            result['query'] = query
+        if continuation:
+            continuation['continue'] = '-||'
+            result['continue'] = continuation
+        result['batchcomplete'] = True if self.fv2(params) else ''
+        return result
+
+    # --- meta modules -------------------------------------------------
+
+    def meta_siteinfo(self, params, query):
+        props = params.get('siprop', 'general').split('|')
+        fv2 = self.fv2(params)
+        for prop in props:
+            if prop == 'general':
+                query['general'] = {
+                    'mainpage': 'Main Page', 'base': 'http://127.0.0.1/wiki/Main_Page', 'sitename': 'FakeWiki',
+                    'mainpageisdomainroot': False, 'logo': '', 'generator': 'MediaWiki 1.39.3', 'phpversion': '8.1',
+                    'phpsapi': 'fpm-fcgi', 'dbtype': 'sqlite', 'dbversion': '3', 'imagewhitelistenabled': False,
+                    'langconversion': False, 'titleconversion': False, 'linkprefixcharset': '', 'linkprefix': '',
+                    'linktrail': '/^([a-z]+)(.*)$/sD', 'legaltitlechars':
+                        " %!\"$&'()*,\\-.\\/0-9:;=?@A-Z\\\\^_`a-z~\\x80-\\xFF+", 'invalidusernamechars': '@:',
+                    'fixarabicunicode': False, 'fixmalayalamunicode': False, 'case': 'first-letter', 'lang': 'en',
+                    'fallback': [], 'rtl': False, 'fallback8bitEncoding': 'windows-1252', 'readonly': False,
+                    'writeapi': True, 'maxarticlesize': 2097152, 'timezone': 'UTC', 'timeoffset': 0,
+                    'articlepath': '/wiki/$1', 'scriptpath': '/w', 'script': '/w/index.php',
+                    'variantarticlepath': False, 'server': 'http://127.0.0.1', 'servername': '127.0.0.1',
+                    'wikiid': 'fakewiki', 'time': timestamp(), 'misermode': False, 'uploadsenabled': True,
+                    'maxuploadsize': 104857600, 'minuploadchunksize': 1024, 'thumblimits': {}, 'imagelimits': {},
+                    'favicon': '', 'centralidlookupprovider': 'local', 'allcentralidlookupproviders': ['local'],
+                    'interwikimagic': True, 'magiclinks': {}, 'categorycollation': 'uppercase',
+                }
+            elif prop == 'namespaces':
+                namespaces = {}
+                for ns_id, name in NAMESPACES.items():
+                    entry = {'id': ns_id, 'case': 'first-letter', 'subpages': ns_id not in (0, 6, 14, -1, -2),
+                             'canonical': name, 'content': ns_id == 0, 'nonincludable': False}
+                    if fv2:
+                        entry['name'] = name
+                    else:
+                        entry['*'] = name
+                        for flag in ('subpages', 'content', 'nonincludable'):
+                            if entry[flag]:
+                                entry[flag] = ''
+                            else:
+                                del entry[flag]
+                    if not name:
+                        del entry['canonical']
+                    namespaces[str(ns_id)] = entry
+                query['namespaces'] = namespaces
+            elif prop == 'namespacealiases':
+                alias = {'id': 6, 'alias' if fv2 else '*': 'Image'}
+                query['namespacealiases'] = [alias]
+            elif prop == 'dbrepllag':
+                query['dbrepllag'] = [{'host': '127.0.0.1', 'lag': self.lag}]
+            elif prop in ('interwikimap', 'magicwords', 'extensions', 'libraries', 'specialpagealiases',
+                          'extensiontags', 'functionhooks', 'showhooks', 'skins', 'protocols', 'usergroups',
+                          'languages', 'fileextensions', 'restrictions'):
+                if prop == 'restrictions':
+                    query['restrictions'] = {'types': ['edit', 'move', 'upload'], 'levels': ['', 'sysop'],
+                                             'cascadinglevels': ['sysop'], 'semiprotectedlevels': []}
+                elif prop == 'magicwords':
+                    query['magicwords'] = [{'name': 'redirect', 'aliases': ['#REDIRECT'], 'case-sensitive': False}]
+                elif prop == 'protocols':
+                    query['protocols'] = ['http://', 'https://']
+                elif prop == 'fileextensions':
+                    query['fileextensions'] = [{'ext': ext} for ext in ('png', 'gif', 'jpg', 'jpeg', 'svg')]
+                else:
+                    query[prop] = []
+            else:
+                query[prop] = {}
+
+    def meta_userinfo(self, params, query):
+        rights = ['read', 'edit', 'createpage', 'bot', 'writeapi', 'noratelimit'] if not self.edit_rate else \
+            ['read', 'edit', 'createpage', 'bot', 'writeapi']
+        if self.high_limits:
+            rights.append('apihighlimits')
+        info = {'id': 1, 'name': self.username, 'groups': ['*', 'user', 'bot'], 'rights': rights,
+                'messages': False, 'ratelimits': {}}
+        if self.edit_rate:
+            hits, seconds = self.edit_rate
+            info['ratelimits'] = {'edit': {'user': {'hits': hits, 'seconds': seconds}}}
+        query['userinfo'] = info
+
+    def meta_tokens(self, params, query):
+        tokens = {}
+        for token_type in params.get('type', 'csrf').split('|'):
+            tokens[f'{token_type}token'] = 'fakelogin+\\' if token_type == 'login' else 'fakecsrf+\\'
+        query['tokens'] = tokens
+
+    # --- list modules -------------------------------------------------
+
+    def _allpages(self, params, prefix, continuation):
+        namespace = int(params.get(f'{prefix}namespace', 0))
+        filterredir = params.get(f'{prefix}filterredir', 'all')
+        start = params.get(f'{prefix}continue') or params.get(f'{prefix}from', '')
+        limit = self.limit(params, f'{prefix}limit')
+        titles = []
+        for title in sorted(self.pages):
+            page = self.pages[title]
+            if page['ns'] != namespace:
+                continue
+            bare = self.split_title(title)[1]
+            if bare < start:
+                continue
+            is_redirect = self.redirect_target(page) is not None
+            if (filterredir == 'redirects' and not is_redirect) or (filterredir == 'nonredirects' and is_redirect):
+                continue
+            if len(titles) == limit:
+                continuation[f'{prefix}continue'] = bare
+                break
+            titles.append(title)
+        return titles
+
+    def list_allpages(self, params, query, continuation):
+        titles = self._allpages(params, 'ap', continuation)
+        query['allpages'] = [self.page_stub(self.pages[title]) for title in titles]
+
+    def generator_allpages(self, params, continuation):
+        return self._allpages(params, 'gap', continuation)
+
+    def page_stub(self, page):
+        return {'pageid': page['pageid'], 'ns': page['ns'], 'title': page['title']}
+
+    def _offset_slice(self, items, params, prefix, continuation):
+        offset = int(params.get(f'{prefix}offset', 0) or params.get(f'{prefix}continue', 0) or 0)
+        limit = self.limit(params, f'{prefix}limit')
+        if offset + limit < len(items):
+            key = f'{prefix}offset' if prefix.endswith('qp') else f'{prefix}continue'
+            continuation[key] = offset + limit
+        return items[offset:offset + limit]
+
+    def list_querypage(self, params, query, continuation):
+        if params.get('qppage') != 'DoubleRedirects':
+            raise ApiError('badvalue', f'Unrecognized value for parameter "qppage": {params.get("qppage")}.')
+        results = []
+        for title in sorted(self.pages):
+            target = self.redirect_target(self.pages[title])
+            if target and target[0] in self.pages and self.redirect_target(self.pages[target[0]]):
+                results.append({'value': '0', 'ns': self.pages[title]['ns'], 'title': title})
+        query['querypage'] = {'name': 'DoubleRedirects', 'results':
+                              self._offset_slice(results, params, 'qp', continuation)}
+
+    def _imageusage(self, params, prefix, continuation):
+        _, file_name = self.split_title(params[f'{prefix}title'])
+        users = []
+        for title in sorted(self.pages):
+            text = self.latest(self.pages[title])['text']
+            names = {self.split_title(name)[1] for name in FILE_LINK_PATTERN.findall(text)}
+            if file_name in names:
+                users.append(title)
+        return self._offset_slice(users, params, prefix, continuation)
+
+    def list_imageusage(self, params, query, continuation):
+        query['imageusage'] = [self.page_stub(self.pages[t]) for t in self._imageusage(params, 'iu', continuation)]
+
+    def generator_imageusage(self, params, continuation):
+        return self._imageusage(params, 'giu', continuation)
+
+    def generator_templates(self, params, continuation):
+        used = []
+        for title in params.get('titles', '').split('|'):
+            page = self.pages.get(self.normalize(title))
+            if page is not None:
+                for name in re.findall(r'\{\{\s*([^|{}\n]+?)\s*(?:\||\}\})', self.latest(page)['text']):
+                    used.append(self.normalize(name if ':' in name else f'Template:{name}'))
+        return list(dict.fromkeys(used))
+
+    def generator_categories(self, params, continuation):
+        return []
+
+    def generator_links(self, params, continuation):
+        return []
+
+    def list_allredirects(self, params, query, continuation):
+        entries = []
+        for title in sorted(self.pages):
+            target = self.redirect_target(self.pages[title])
+            if target:
+                entries.append({'fromid': self.pages[title]['pageid'], 'ns': self.split_title(target[0])[0],
+                                'title': target[0]})
+        query['allredirects'] = self._offset_slice(entries, params, 'ar', continuation)
+
+    def _changes(self, params, prefix):
+        changes = list(self.recent_changes)
+        start, end = params.get(f'{prefix}start'), params.get(f'{prefix}end')
+        newer = params.get(f'{prefix}dir', 'older') == 'newer'
+        if newer:
+            start, end = end, start
+        if end:
+            changes = [c for c in changes if c['timestamp'] >= end]
+        if start:
+            changes = [c for c in changes if c['timestamp'] <= start]
+        if not newer:
+            changes.reverse()
+        return changes
+
+    def list_recentchanges(self, params, query, continuation):
+        changes = self._changes(params, 'rc')
+        types = params.get('rctype')
+        if types:
+            changes = [c for c in changes if c['type'] in types.split('|')]
+        if 'rcnamespace' in params:
+            namespaces = {int(ns) for ns in params['rcnamespace'].split('|')}
+            changes = [c for c in changes if c['ns'] in namespaces]
+        entries = []
+        for change in self._offset_slice(changes, params, 'rc', continuation):
+            entry = {k: v for k, v in change.items() if k not in ('logparams',)}
+            if change['type'] == 'log':
+                entry['logparams'] = change['logparams']
+            page = self.pages.get(change['title'])
+            is_redirect = page is not None and self.redirect_target(page) is not None
+            if is_redirect:
+                entry['redirect'] = True if self.fv2(params) else ''
+            entries.append(entry)
+        query['recentchanges'] = entries
+
+    def list_logevents(self, params, query, continuation):
+        changes = [c for c in self._changes(params, 'le') if c['type'] == 'log']
+        if 'letype' in params:
+            changes = [c for c in changes if c['logtype'] == params['letype']]
+        entries = []
+        for change in self._offset_slice(changes, params, 'le', continuation):
+            entries.append({'logid': change['logid'], 'ns': change['ns'], 'title': change['title'],
+                            'pageid': change['pageid'], 'logpage': change['pageid'], 'type': change['logtype'],
+                            'action': change['logaction'], 'params': change['logparams'],
+                            'user': change['user'], 'timestamp': change['timestamp'], 'comment': ''})
+        query['logevents'] = entries
+
+    # --- page sets ----------------------------------------------------
+
+    def pageset(self, params, titles, query, continuation):
+        fv2 = self.fv2(params)
+        normalized, redirects = [], []
+        resolved = []
+        for title in titles:
+            if title.startswith('#'):
+                resolved.append(title)
+                continue
+            norm = self.normalize(title)
+            if norm != title:
+                normalized.append({'from': title, 'to': norm})
+            resolved.append(norm)
+        if params.get('redirects', 'false') not in ('false', '0'):
+            seen = set()
+            final = []
+            for title in resolved:
+                hops = set()
+                while title in self.pages and title not in hops:
+                    target = self.redirect_target(self.pages[title])
+                    if not target:
+                        break
+                    hops.add(title)
+                    if (title, target[0]) not in seen:
+                        seen.add((title, target[0]))
+                        entry = {'from': title, 'to': target[0]}
+                        if target[1]:
+                            entry['tofragment'] = target[1]
+                        redirects.append(entry)
+                    title = target[0]
+                final.append(title)
+            resolved = final
+        if normalized:
+            query['normalized'] = normalized
+        if redirects:
+            query['redirects'] = redirects
+        props = set(filter(None, params.get('prop', '').split('|')))
+        pages = []
+        missing_id = -1
+        for title in dict.fromkeys(resolved):
+            page = self.pages.get(title)
+            if page is None:
+                if title.startswith('#'):
+                    entry = {'pageid': int(title[1:]), 'missing': True}
+                else:
+                    entry = {'ns': self.split_title(title)[0], 'title': title, 'missing': True}
+                    if 'info' in props:
+                        entry['contentmodel'] = 'wikitext'
+                entry['_key'] = str(missing_id)
+                missing_id -= 1
+                pages.append(entry)
+                continue
+            entry = self.page_stub(page)
+            latest = self.latest(page)
+            if 'info' in props or not props:
+                entry.update({'contentmodel': 'wikitext', 'pagelanguage': 'en', 'pagelanguagehtmlcode': 'en',
+                              'pagelanguagedir': 'ltr', 'touched': latest['timestamp'],
+                              'lastrevid': latest['revid'], 'length': len(latest['text'].encode('utf-8'))})
+                if self.redirect_target(page):
+                    entry['redirect'] = True
+                if len(page['revs']) == 1:
+                    entry['new'] = True
+            if 'revisions' in props:
+                entry['revisions'] = [self.revision_entry(params, latest)]
+            entry['_key'] = str(page['pageid'])
+            pages.append(entry)
+        if fv2:
+            for entry in pages:
+                entry.pop('_key')
+            query['pages'] = pages
+        else:
+            result = {}
+            for entry in pages:
+                key = entry.pop('_key')
+                for flag in ('missing', 'redirect', 'new'):
+                    if entry.get(flag) is True:
+                        entry[flag] = ''
+                result[key] = entry
+            query['pages'] = result
+
+    def revision_entry(self, params, revision):
+        props = params.get('rvprop', 'ids|timestamp|flags|comment|user').split('|')
+        entry = {}
+        if 'ids' in props:
+            entry['revid'] = revision['revid']
+            entry['parentid'] = revision['parentid']
+        for prop in ('user', 'timestamp', 'comment'):
+            if prop in props:
+                entry[prop] = revision[prop]
+        if 'sha1' in props:
+            entry['sha1'] = hashlib.sha1(revision['text'].encode('utf-8')).hexdigest()
+        if 'size' in props:
+            entry['size'] = len(revision['text'].encode('utf-8'))
+        if 'content' in props:
+            if self.fv2(params):
+                main = {'contentmodel': 'wikitext', 'contentformat': 'text/x-wiki', 'content': revision['text']}
+            else:
+                main = {'contentmodel': 'wikitext', 'contentformat': 'text/x-wiki', '*': revision['text']}
+            if 'rvslots' in params:
+                entry['slots'] = {'main': main}
+            else:
+                entry.update(main)
+        return entry
+
+
+class Handler(BaseHTTPRequestHandler):
+    wiki = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        query = urllib.parse.urlsplit(self.path).query
+        self.respond(dict(urllib.parse.parse_qsl(query, keep_blank_values=True)))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        params = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query, keep_blank_values=True))
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('multipart/form-data'):
+            message = BytesParser(policy=HTTP).parsebytes(
+                b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body)
+            for part in message.iter_parts():
+                params[part.get_param('name', header='content-disposition')] = part.get_content()
+        else:
+            params.update(urllib.parse.parse_qsl(body.decode('utf-8'), keep_blank_values=True))
+        self.respond(params)
+
+    def respond(self, params):
+        headers = {}
+        try:
+            result = self.wiki.handle(params)
+        except ApiError as e:
+            result = {'error': {'code': e.code, 'info': e.info, '*': ''}}
+            if e.retry_after:
+                headers['Retry-After'] = str(e.retry_after)
+            if e.code == 'maxlag':
+                result['error'].update({'host': '127.0.0.1', 'lag': self.wiki.lag})
+                headers['X-Database-Lag'] = str(self.wiki.lag)
+        except Exception as e:
+            result = {'error': {'code': 'internal_api_error', 'info': f'{type(e).__name__}: {e}', '*': ''}}
+        body = json.dumps(result).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if 'error' in result:
+            self.send_header('MediaWiki-API-Error', result['error']['code'])
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(wiki, host='127.0.0.1', port=8765):
+    """Start serving *wiki* on a background thread and return the server."""
+    handler = type('FakeWikiHandler', (Handler,), {'wiki': wiki})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def seed(wiki, pages):
+    """Fill the wiki with the benchmark corpus plus double redirects and file usages for the scripts to fix."""
+    from bench.corpus import Corpus
+
+    rng = random.Random(0)
+    for page in Corpus(pages).pages:
+        text = page.text
+        if rng.random() < 0.1:
+            text += '\n[[File:REPLACED.png|32px]]'
+        wiki.add_page(page.title, text, log=False)
+    wiki.add_page('File:REPLACED.png', 'Duplicate icon.', log=False)
+    wiki.add_page('File:REPLACER.png', 'Icon.', log=False)
+    for index in range(0, pages, 20):
+        wiki.add_page(f'Alias {index}', f'#REDIRECT [[Item{index}]]', log=False)
+        wiki.add_page(f'Old alias {index}', f'#REDIRECT [[Alias {index}]]', log=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--pages', type=int, default=1000, help='number of synthetic pages to seed')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--lag', type=float, default=0.0, help='replication lag reported to maxlag checks')
+    parser.add_argument('--edit-rate', default=None, help='edit rate limit as HITS/SECONDS, e.g. 8/60')
+    parser.add_argument('--high-limits', action='store_true', help='grant the apihighlimits right')
+    args = parser.parse_args()
+
+    edit_rate = tuple(int(x) for x in args.edit_rate.split('/')) if args.edit_rate else None
+    wiki = FakeWiki(latency=args.latency, lag=args.lag, edit_rate=edit_rate, high_limits=args.high_limits)
+    seed(wiki, args.pages)
+    server = serve(wiki, port=args.port)
+    print(f'Serving {len(wiki.pages)} pages on http://127.0.0.1:{args.port}/w/api.php')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(wiki.stats)
+
+
+if __name__ == '__main__':
+    main()
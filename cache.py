@@ -0,0 +1,136 @@
+import sqlite3
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from fetcher import WikiPage, batch_size, batched, fetch_batch
+from pipeline import bounded_map
+
+
+def latest_revids(site, titles):
+    """Return {title: lastrevid} for a batch of titles using one prop=info request.
+
+    Missing pages map to None. Titles are returned in their normalized form.
+    """
+    params = {
+        'action': 'query',
+        'prop': 'info',
+        'titles': '|'.join(titles),
+        'formatversion': 2,
+    }
+    revids = {}
+    data = site.simple_request(**params).submit()
+    for page in data.get('query', {}).get('pages', []):
+        if 'missing' in page or 'invalid' in page:
+            revids[page.get('title')] = None
+        else:
+            revids[page['title']] = page['lastrevid']
+    return revids
+
+
+class WikitextCache:
+    """On-disk wikitext cache keyed by title and revid.
+
+    Text is stored zlib-compressed in SQLite. Only the newest revision seen
+    for each title is kept.
+    """
+
+    def __init__(self, path='wikitext_cache.sqlite3'):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS revisions ('
+                'title TEXT NOT NULL, revid INTEGER NOT NULL, ns INTEGER, pageid INTEGER, timestamp TEXT, '
+                'text BLOB NOT NULL, PRIMARY KEY (title, revid))'
+            )
+
+    def get(self, title, revid):
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT ns, pageid, timestamp, text FROM revisions WHERE title = ? AND revid = ?', (title, revid)
+            ).fetchone()
+        if row is None:
+            return None
+        ns, pageid, timestamp, text = row
+        return WikiPage(title, ns, pageid, revid, timestamp, zlib.decompress(text).decode('utf-8'))
+
+    def put_many(self, pages):
+        rows = [(page.title, page.revid, page.ns, page.pageid, page.timestamp,
+                 zlib.compress(page.text.encode('utf-8'))) for page in pages if page.exists]
+        if not rows:
+            return
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'DELETE FROM revisions WHERE title = ? AND revid < ?', [(row[0], row[1]) for row in rows]
+            )
+            self.connection.executemany('INSERT OR REPLACE INTO revisions VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def put(self, page):
+        self.put_many([page])
+
+    def forget(self, titles):
+        with self.lock, self.connection:
+            self.connection.executemany('DELETE FROM revisions WHERE title = ?', [(title,) for title in titles])
+
+    def has(self, title, revid):
+        with self.lock:
+            return self.connection.execute(
+                'SELECT 1 FROM revisions WHERE title = ? AND revid = ?', (title, revid)
+            ).fetchone() is not None
+
+    def revisions(self):
+        """Return {title: revid} for every cached page."""
+        with self.lock:
+            return dict(self.connection.execute('SELECT title, revid FROM revisions'))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def fetch_batch(self, site, titles):
+        """Serve unchanged pages from the cache and download only stale ones."""
+        pages = []
+        stale = []
+        revids = latest_revids(site, titles)
+        self.forget([title for title, revid in revids.items() if revid is None])
+        for title, revid in revids.items():
+            if revid is None:
+                pages.append(WikiPage(title, None, None, None, None, None))
+                continue
+            page = self.get(title, revid)
+            if page is None:
+                stale.append(title)
+            else:
+                pages.append(page)
+        if stale:
+            fetched = fetch_batch(site, stale)
+            self.put_many(fetched)
+            pages.extend(fetched)
+        return pages
+
+    def refresh_batch(self, site, titles):
+        revids = latest_revids(site, titles)
+        self.forget([title for title, revid in revids.items() if revid is None])
+        stale = [title for title, revid in revids.items() if revid is not None and not self.has(title, revid)]
+        if stale:
+            self.put_many(fetch_batch(site, stale))
+        return len(stale)
+
+    def refresh(self, site, titles, max_workers=4):
+        """Bring the cache up to date for titles without reading unchanged text back. Returns pages fetched."""
+        titles = [title for title in titles if title]
+        size = batch_size(site)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return sum(bounded_map(executor, lambda batch: self.refresh_batch(site, batch), batched(titles, size),
+                                   2 * max_workers))
+
+    def fetch_pages(self, site, titles, max_workers=4):
+        """Cached counterpart of fetcher.fetch_pages."""
+        titles = [title for title in titles if title]
+        size = batch_size(site)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            batches = bounded_map(executor, lambda batch: self.fetch_batch(site, batch), batched(titles, size),
+                                  2 * max_workers)
+            for pages in batches:
+                yield from pages
@@ -1,57 +1,121 @@
+import argparse
+import hashlib
 import os
 import re
 import csv
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 import pywikibot
-from pywikibot import sleep
+from cache import WikitextCache
+from itemparser import iter_items
+from pipeline import SaveQueue
+from scheduler import EditScheduler
+from snippets import SnippetStore, diff_snapshots
 
 
-def count_items(files):
-    count = 0
-    for file_path in files:
-        with open(file_path, 'r') as f:
-            count += sum(1 for line in f if line.strip().startswith('item'))
-    return count
-
+def process_file(file_path, version):
+    """(name, CodeSnip text, hash of the fields the CodeSnip shows) for every item in a resource file.
 
-def process_file(file_path, version, progress=None):
+    None if the file could not be read or parsed.
+    """
+    snippets = []
     try:
+        source = os.path.basename(file_path)
         with open(file_path, 'r') as f:
-            lines = f.readlines()
-        for i, line in enumerate(lines):
-            if line.strip().startswith('item'):
-                item_code, line_num = extract_code_snippet(i, lines)
-                item_name = line.split()[1]
-                save_snippet(item_name, item_code, line_num, os.path.basename(file_path), version)
-        if progress is not None:
-            progress.update(1)
+            for item_name, line_num, item_code in iter_items(f):
+                # An item that only moved within its file or to another file still needs its pages updated
+                digest = hashlib.sha1(f"{source}\n{line_num}\n{item_code.strip()}".encode('utf-8')).hexdigest()
+                for name, text in format_snippet(item_name, item_code, line_num, source, version):
+                    snippets.append((name, text, digest))
     except Exception as e:
         print(f"Error processing file {file_path}: {e}")
-
-
-def code_base_main(version):
-    if not os.path.exists('./output'):
-        os.makedirs('./output')
-    files = [os.path.join(root, file) for root, dirs, files in os.walk("./resources") for file in files]
-    with ThreadPoolExecutor(max_workers=200) as executor:
-        futures = [executor.submit(process_file, file_path, version) for file_path in files]
-        for future in as_completed(futures):
-            pass
-
-
-def extract_code_snippet(line_number, lines):
-    item_code = ""
-    for i in range(line_number, len(lines)):
-        item_code += lines[i]
-        if '}' in lines[i]:
-            break
-    return item_code, line_number + 1
-
-
-def save_snippet(item_name, item_code, line, source, version):
-    def write_snippet(name):
-        formatted_code = f"""{{{{CodeSnip
+        return None
+    return snippets
+
+
+def file_hash(file_path):
+    with open(file_path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def parse_files(files, version, max_workers=None):
+    """{path: process_file(path)} for the given files."""
+    if not files:
+        return {}
+    # Parsing is CPU-bound, so files are spread over one process per core instead of GIL-bound threads
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(process_file, files, [version] * len(files), chunksize=8)
+        return dict(zip(files, tqdm(results, total=len(files), desc="Parsing resource files")))
+
+
+def item_owners(files, items):
+    """{name: path} of the file each item's snippet comes from; a later file wins, as in a full regeneration."""
+    return {name: path for path in files for name, _ in items[path]}
+
+
+def code_base_main(version, max_workers=None):
+    files = sorted(os.path.join(root, file) for root, dirs, files in os.walk("./resources") for file in files)
+    store = SnippetStore()
+    manifest = store.manifest()
+
+    # Only files that are new, changed or parsed for another version are read again
+    entries = []
+    stale = []
+    for path in files:
+        stat = os.stat(path)
+        entry = manifest.get(path)
+        if entry and entry[3] == version and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+            continue
+        digest = file_hash(path)
+        if entry and entry[3] == version and entry[2] == digest:
+            entries.append((path, stat.st_mtime_ns, stat.st_size, digest, version, entry[4]))  # Touched, not changed
+        else:
+            entries.append((path, stat.st_mtime_ns, stat.st_size, digest, version, None))
+            stale.append(path)
+    deleted = manifest.keys() - set(files)
+    if not entries and not deleted:
+        store.close()
+        print("Resource files unchanged")
+        return
+
+    parsed = parse_files(stale, version, max_workers)
+    # A file that fails to parse keeps the items it had and is parsed again on the next run
+    failed = {path for path, snippets in parsed.items() if snippets is None}
+    parsed = {path: snippets for path, snippets in parsed.items() if snippets is not None}
+    entries = [entry for entry in entries if entry[0] not in failed]
+    items = {path: manifest[path][4] if path in manifest else [] for path in files if path not in parsed}
+    items.update({path: [(name, digest) for name, _, digest in snippets] for path, snippets in parsed.items()})
+    owners = item_owners(files, items)
+    previous = item_owners(sorted(manifest), {path: entry[4] for path, entry in manifest.items()})
+    # An item another file used to provide is written again from the unchanged file that provides it now
+    moved = sorted({path for name, path in owners.items() if path not in parsed and previous.get(name) != path})
+    for path, snippets in parse_files(moved, version, max_workers).items():
+        if snippets is None:
+            failed.add(path)
+        else:
+            parsed[path] = snippets
+
+    # Everything is written in one transaction; snippets that did not change are left as they are
+    snippets = [(name, text) for path, file_snippets in parsed.items()
+                for name, text, _ in file_snippets if owners[name] == path]
+    changed = store.put_many(snippets)
+    retired = previous.keys() - owners.keys()  # Items of deleted files, or dropped from changed ones
+    if not manifest and not failed:
+        # Snippets written before there was a manifest have no file on record, so any no file provides now go
+        retired |= store.names() - owners.keys()
+    store.remove(retired)
+    # Kept per version so a later run can update only what changed
+    store.put_snapshot(version, {name: digest for path in files for name, digest in items[path]})
+    if manifest or not failed:
+        # Without a first manifest the next run regenerates everything and can still retire the orphans
+        store.update_manifest([entry[:5] + (items[entry[0]],) for entry in entries], removed=deleted)
+    store.close()
+    print(f"{len(parsed)} of {len(files)} files parsed, {len(failed)} failed, {changed} snippets new or changed, "
+          f"{len(retired)} retired")
+
+
+def format_snippet(item_name, item_code, line, source, version):
+    formatted_code = f"""{{{{CodeSnip
   | lang = java
   | line = true
   | start = {line}
@@ -61,31 +125,64 @@ def save_snippet(item_name, item_code, line, source, version):
   | code =
 {item_code.strip()} 
 }}}}"""
-        with open(f'./output/{name}.txt', 'w') as f:
-            f.write(formatted_code)
-
-    write_snippet(item_name)
+    yield item_name, formatted_code
     if item_name.endswith("TEXTURE_TINT") or item_name.endswith("DECAL_TINT"):
         base_name = item_name.replace("TEXTURE_TINT", "").replace("DECAL_TINT", "")
-        write_snippet(base_name)
-
+        yield base_name, formatted_code
+
+
+def wiki_main(version, since=None):
+    search_results = [line.strip() for line in open('search_results.txt', 'r', encoding='utf-8') if line.strip()]
+    store = SnippetStore()
+    snippets = store.load()  # Every CodeSnip is looked up in memory
+
+    if since:
+        old, new = store.snapshot(since), store.snapshot(version)
+        if not old or not new:
+            print(f"Update the code base for versions {since} and {version} first")
+            store.close()
+            return
+        added, changed, removed = diff_snapshots(old, new)
+        touched = added | changed | removed
+        seen = store.pages()
+        # Pages not seen by an earlier run are checked too, since their items are not known yet
+        search_results = [title for title in search_results if title not in seen or seen[title] & touched]
+        print(f"{len(added)} added, {len(changed)} changed and {len(removed)} removed items since {since}, "
+              f"{len(search_results)} pages to check")
 
-def wiki_main(version):
     site = pywikibot.Site()
     site.login()
-    search_results = [line.strip() for line in open('search_results.txt', 'r', encoding='utf-8')]
+    scheduler = EditScheduler(site)
     progress = tqdm(total=len(search_results), desc="Updating wiki pages")
-
-    for article_name in search_results:
-        process_article(article_name, version, site)
+    saving = tqdm(desc="Saving pages", position=1)
+    cache = WikitextCache()
+
+    def save(item):
+        save_article(*item, site, scheduler)
+        saving.update(1)
+
+    # Pages are saved by a single writer thread while the next ones are fetched and checked;
+    # at most 32 updated texts wait in memory for the edit throttle
+    writer = SaveQueue(save, max_pending=32)
+    for wiki_page in cache.fetch_pages(site, search_results):
+        if wiki_page.exists:
+            text, updated, items = process_article(wiki_page, version, snippets)
+            store.record_page(wiki_page.title, items)
+            if updated:
+                writer.put((wiki_page.title, text))
         progress.update(1)
+    cache.close()
+    store.close()
+    writer.close()
+    saving.close()
 
 
-def process_article(article_name, version, site):
-    page = pywikibot.Page(site, article_name)
-    text = page.text
+def process_article(wiki_page, version, snippets):
+    article_name = wiki_page.title
+    text = wiki_page.text
     pattern = re.compile(r'{{CodeSnip(.*?)}}', re.DOTALL)
     updated = False
+    items = set()
 
     for match in re.finditer(pattern, text):
         snippet = match.group(0)
@@ -93,38 +190,45 @@ def process_article(article_name, version, site):
         item_name_match = item_name_pattern.search(snippet)
         if item_name_match:
             item_name = item_name_match.group(1).strip().replace("item ", "")
-            try:
-                with open(f'./output/{item_name}.txt', 'r') as f:
-                    new_snippet = f.read()
-                    if new_snippet != snippet:  # Check if snippet has changed
-                        text = text.replace(snippet, new_snippet)
-                        updated = True
-            except FileNotFoundError:
+            items.add(item_name)
+            new_snippet = snippets.get(item_name)
+            if new_snippet is not None:
+                if new_snippet != snippet:  # Check if snippet has changed
+                    text = text.replace(snippet, new_snippet)
+                    updated = True
+            else:
                 with open('failed_code.csv', 'a', newline='') as csvfile:
                     csvwriter = csv.writer(csvfile)
-                    csvwriter.writerow([article_name, "Item file not found"])
+                    csvwriter.writerow([article_name, f"No snippet for {item_name} in the snippet store"])
         else:
             with open('failed_code.csv', 'a', newline='') as csvfile:
                 csvwriter = csv.writer(csvfile)
                 csvwriter.writerow([article_name, "Item name not found in CodeSnip"])
 
-    if updated:
-        page.text = text
-        try:
-            page.save(summary="Automated CodeBox update", tags="bot")
-            sleep(6)
-        except Exception as e:
-            pass
+    return text, updated, items
+
+
+def save_article(article_name, text, site, scheduler):
+    page = pywikibot.Page(site, article_name)
+    page.text = text
+    try:
+        scheduler.save(page, summary="Automated CodeBox update", tags="bot")
+    except Exception as e:
+        pass
 
 
 if __name__ == "__main__":
-    version = "41.78.16"
+    parser = argparse.ArgumentParser(description="Generate CodeSnips from the game scripts and update them on the wiki.")
+    parser.add_argument('--version', default="41.78.16",
+                        help="game version of the files in ./resources (default: %(default)s)")
+    parser.add_argument('--since', help="only update wiki pages whose items changed since this parsed version")
+    args = parser.parse_args()
     while True:
         choice = input("Update code base (1) or update wiki (2)?: ")
         if choice == '1':
-            code_base_main(version)
+            code_base_main(args.version)
         elif choice == '2':
-            wiki_main(version)
+            wiki_main(args.version, since=args.since)
         elif choice == 'exit':
             break
         else:
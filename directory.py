@@ -0,0 +1,96 @@
+import datetime
+import json
+import os
+
+import pywikibot
+
+EXCLUDE_NAMESPACES = [-2, -1, 2, 3, 6, 7, 8, 9]
+
+# Older syncs cannot be replayed from recentchanges ($wgRCMaxAge), so rebuild instead
+MAX_SYNC_AGE = datetime.timedelta(days=30)
+
+
+class WikiDirectory:
+    """Title, namespace, pageid and redirect flag for every page on the wiki.
+
+    Stored as JSON together with the time of the last sync. The plain title
+    list in wiki_directory.txt is regenerated on every save for the scripts
+    that read it directly.
+    """
+
+    def __init__(self, path='wiki_directory.json', titles_path='wiki_directory.txt'):
+        self.path = path
+        self.titles_path = titles_path
+        self.synced = None
+        self.pages = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            self.synced = data['synced']
+            self.pages = {title: {'ns': ns, 'pageid': pageid, 'redirect': redirect}
+                          for title, ns, pageid, redirect in data['pages']}
+
+    def save(self):
+        pages = sorted(self.pages.items(), key=lambda item: (item[1]['ns'], item[0]))
+        with open(self.path, 'w', encoding='utf-8') as file:
+            json.dump({
+                'synced': self.synced,
+                'pages': [[title, info['ns'], info['pageid'], info['redirect']] for title, info in pages],
+            }, file, ensure_ascii=False)
+        with open(self.titles_path, 'w', encoding='utf-8') as file:
+            file.writelines(f"{title}\n" for title, info in pages if not info['redirect'])
+
+    def titles(self, namespaces=None, redirects=False):
+        return [title for title, info in self.pages.items()
+                if (redirects or not info['redirect']) and (namespaces is None or info['ns'] in namespaces)]
+
+    def needs_rebuild(self, now):
+        if self.synced is None:
+            return True
+        return now - pywikibot.Timestamp.fromISOformat(self.synced) > MAX_SYNC_AGE
+
+    def rebuild(self, site):
+        """Enumerate every namespace with allpages."""
+        pages = {}
+        for ns_id in site.namespaces:
+            if ns_id in EXCLUDE_NAMESPACES:
+                continue
+            for page in site.allpages(namespace=ns_id, total=None, filterredir=None):
+                pages[page.title()] = {'ns': ns_id, 'pageid': page.pageid, 'redirect': page.isRedirectPage()}
+        self.pages = pages
+
+    def apply_change(self, change):
+        title = change['title']
+        ns = change['ns']
+        if change['type'] in ('new', 'edit'):
+            if ns not in EXCLUDE_NAMESPACES:
+                self.pages[title] = {'ns': ns, 'pageid': change['pageid'], 'redirect': 'redirect' in change}
+        elif change['type'] == 'log':
+            action = (change.get('logtype'), change.get('logaction'))
+            params = change.get('logparams', {})
+            if action == ('delete', 'delete'):
+                self.pages.pop(title, None)
+            elif action == ('delete', 'restore') and ns not in EXCLUDE_NAMESPACES:
+                self.pages[title] = {'ns': ns, 'pageid': change['pageid'], 'redirect': False}
+            elif change.get('logtype') == 'move':
+                moved = self.pages.pop(title, None)
+                target_ns = params.get('target_ns', ns)
+                if target_ns not in EXCLUDE_NAMESPACES:
+                    pageid = moved['pageid'] if moved else change['pageid']
+                    redirect = moved['redirect'] if moved else False
+                    self.pages[params['target_title']] = {'ns': target_ns, 'pageid': pageid, 'redirect': redirect}
+                if 'suppressredirect' not in params and ns not in EXCLUDE_NAMESPACES:
+                    # The old title is left behind as a redirect with a new pageid we don't know yet
+                    self.pages[title] = {'ns': ns, 'pageid': None, 'redirect': True}
+
+    def sync(self, site):
+        """Bring the directory up to date, incrementally when possible."""
+        now = site.server_time()
+        if self.needs_rebuild(now):
+            self.rebuild(site)
+        else:
+            start = pywikibot.Timestamp.fromISOformat(self.synced)
+            for change in site.recentchanges(start=start, reverse=True, changetype='new|edit|log'):
+                self.apply_change(change)
+        self.synced = now.isoformat()
+        self.save()
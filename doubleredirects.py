@@ -1,38 +1,100 @@
+import re
 import pywikibot
-import time
 from tqdm import tqdm
+from fetcher import batch_size, batched, fetch_batch
+from scheduler import EditScheduler
+
+REDIRECT_LINK = re.compile(r'^(\s*#REDIRECT\s*:?\s*\[\[)[^\]|]*', re.IGNORECASE)
+
+
+def double_redirects(site):
+    """Titles listed on Special:DoubleRedirects, following the continuation to the end of the list."""
+    params = {'action': 'query', 'list': 'querypage', 'qppage': 'DoubleRedirects', 'qplimit': 'max',
+              'formatversion': 2}
+    titles = []
+    while True:
+        data = site.simple_request(**params).submit()
+        titles.extend(result['title'] for result in data.get('query', {}).get('querypage', {}).get('results', []))
+        if 'continue' not in data:
+            break
+        params.update(data['continue'])
+    return titles
+
+
+def resolve_redirects(site, titles, size=50):
+    """Follow the redirect chain of every title with one redirects=1 query per 50 titles.
+
+    Returns {title: (target, fragment, hops, problem)}: the page the chain
+    ends on, the section to link to (the title's own, else the nearest one
+    along the chain), the number of redirects followed, and 'cycle' or
+    'broken' when the chain loops or ends on a missing page.
+    """
+    targets = {}  # Every redirect the API followed: title -> (target, fragment)
+    aliases = {}
+    missing = set()
+    for batch in batched(titles, size):
+        data = site.simple_request(action='query', titles='|'.join(batch), redirects=1, formatversion=2).submit()
+        query = data.get('query', {})
+        for entry in query.get('normalized', []):
+            aliases[entry['from']] = entry['to']
+        for entry in query.get('redirects', []):
+            targets[entry['from']] = (entry['to'], entry.get('tofragment', ''))
+        for page in query.get('pages', []):
+            if 'missing' in page or 'invalid' in page:
+                missing.add(page.get('title'))
+
+    resolved = {}
+    for title in titles:
+        current = aliases.get(title, title)
+        fragment = ''
+        seen = {current}
+        problem = None
+        while current in targets:
+            current, hop_fragment = targets[current]
+            fragment = fragment or hop_fragment
+            if current in seen:
+                problem = 'cycle'
+                break
+            seen.add(current)
+        if problem is None and current in missing:
+            problem = 'broken'
+        resolved[title] = (current, fragment, len(seen) - 1, problem)
+    return resolved
+
+
+def redirect_text(text, link):
+    """Point a redirect's wikitext at link, keeping anything else on the page such as categories."""
+    new_text, count = REDIRECT_LINK.subn(lambda match: match.group(1) + link, text or '', count=1)
+    return new_text if count else f"#REDIRECT [[{link}]]"
 
-def resolve_redirect(site, title):
-    """Resolve the final target of a redirect."""
-    page = pywikibot.Page(site, title)
-    while page.isRedirectPage():
-        page = page.getRedirectTarget()
-    return page.title()
 
 def main():
     site = pywikibot.Site()
     site.login()  # Login with no parameters
+    scheduler = EditScheduler(site)
+
+    # The whole list is read and resolved in bulk before any edit
+    titles = double_redirects(site)
+    resolved = resolve_redirects(site, titles)
+
+    problems = [(title, result[3], result[0]) for title, result in resolved.items() if result[3]]
+    if problems:
+        with open('redirect_problems.txt', 'w', encoding='utf-8') as report:
+            for title, problem, target in problems:
+                report.write(f"{title}\t{problem}\t{target}\n")
+        print(f"{len(problems)} redirects loop or point to missing pages, see redirect_problems.txt")
+
+    # Chains of a single redirect were fixed since the special page was last updated
+    to_fix = [title for title, result in resolved.items() if result[2] > 1 and not result[3]]
+    texts = {page.title: page.text for batch in batched(to_fix, batch_size(site))
+             for page in fetch_batch(site, batch) if page.exists}
 
-    # Get double redirects using the API
-    double_redirects = []
-    req = site.simple_request(action='query', list='querypage', qppage='DoubleRedirects', qplimit='max')
-    data = req.submit()
-
-    if 'query' in data:
-        double_redirects.extend(data['query']['querypage']['results'])
-
-    # Use tqdm for a progress bar
-    for page_data in tqdm(double_redirects, desc="Processing double redirects"):
-        page = pywikibot.Page(site, page_data['title'])
-        if page.isRedirectPage():
-            final_target = resolve_redirect(site, page.title())
-
-            # Check if the redirect needs to be updated
-            if page.getRedirectTarget().title() != final_target:
-                # Update the redirect to point directly to the final target
-                page.text = f"#REDIRECT [[{final_target}]]"
-                page.save(summary=f"Fixing double redirect to point directly to [[{final_target}]]")
-                time.sleep(6)  # Rate limit
+    for title in tqdm(to_fix, desc="Processing double redirects"):
+        final_target, fragment, _, _ = resolved[title]
+        link = f"{final_target}#{fragment}" if fragment else final_target
+        page = pywikibot.Page(site, title)
+        page.text = redirect_text(texts.get(title), link)
+        scheduler.save(page, summary=f"Fixing double redirect to point directly to [[{link}]]")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,59 @@
+import bz2
+import gzip
+import xml.etree.ElementTree as ET
+
+from fetcher import WikiPage
+
+
+def open_dump(path):
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def iter_dump_pages(path, redirects=False):
+    """Stream the newest revision of every page in a Special:Export / dumpgenerator XML file.
+
+    The file may be bz2 or gzip compressed. Pages are cleared from the tree as
+    soon as they have been yielded, so memory use does not grow with the dump.
+    """
+    with open_dump(path) as file:
+        context = ET.iterparse(file, events=('start', 'end'))
+        _, root = next(context)
+        page = {}
+        in_revision = in_contributor = False
+        for event, element in context:
+            tag = element.tag.rsplit('}', 1)[-1]
+            if event == 'start':
+                if tag == 'page':
+                    page = {'ns': 0, 'redirect': False}
+                elif tag == 'revision':
+                    in_revision = True
+                elif tag == 'contributor':
+                    in_contributor = True
+                continue
+
+            if tag == 'title':
+                page['title'] = element.text
+            elif tag == 'ns':
+                page['ns'] = int(element.text)
+            elif tag == 'redirect':
+                page['redirect'] = True
+            elif tag == 'id' and not in_contributor:
+                page['revid' if in_revision else 'pageid'] = int(element.text)
+            elif tag == 'timestamp':
+                page['timestamp'] = element.text
+            elif tag == 'text':
+                # Later revisions overwrite earlier ones in full-history dumps
+                page['text'] = element.text or ''
+            elif tag == 'contributor':
+                in_contributor = False
+            elif tag == 'revision':
+                in_revision = False
+            elif tag == 'page':
+                if redirects or not page['redirect']:
+                    yield WikiPage(page['title'], page['ns'], page.get('pageid'), page.get('revid', 0),
+                                   page.get('timestamp'), page.get('text', ''))
+                root.clear()
@@ -0,0 +1,68 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline import bounded_map
+
+
+class WikiPage(namedtuple('WikiPage', ['title', 'ns', 'pageid', 'revid', 'timestamp', 'text'])):
+    """Latest revision of a page as returned by a batched prop=revisions query."""
+    __slots__ = ()
+
+    @property
+    def exists(self):
+        return self.revid is not None
+
+
+def batch_size(site):
+    """Number of titles allowed per request: 500 with apihighlimits, 50 otherwise."""
+    return 500 if site.has_right('apihighlimits') else 50
+
+
+def batched(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def fetch_batch(site, titles):
+    """Fetch wikitext, revid and timestamp for up to batch_size(site) titles."""
+    params = {
+        'action': 'query',
+        'prop': 'revisions',
+        'rvprop': 'ids|timestamp|content',
+        'rvslots': 'main',
+        'titles': '|'.join(titles),
+        'formatversion': 2,
+    }
+    pages = []
+    missing = set()  # Missing and invalid pages are listed again in every continuation
+    while True:
+        data = site.simple_request(**params).submit()
+        for page in data.get('query', {}).get('pages', []):
+            if 'missing' in page or 'invalid' in page:
+                if page.get('title') not in missing:
+                    missing.add(page.get('title'))
+                    pages.append(WikiPage(page.get('title'), page.get('ns'), None, None, None, None))
+                continue
+            revisions = page.get('revisions')
+            if not revisions:
+                # Content for this page comes in a later continuation of the same batch
+                continue
+            revision = revisions[0]
+            text = revision.get('slots', {}).get('main', {}).get('content', '')
+            pages.append(WikiPage(page['title'], page['ns'], page['pageid'], revision['revid'],
+                                  revision['timestamp'], text))
+        if 'continue' not in data:
+            break
+        params.update(data['continue'])
+    return pages
+
+
+def fetch_pages(site, titles, max_workers=4):
+    """Yield a WikiPage for every title, batch by batch as the requests complete."""
+    titles = [title for title in titles if title]
+    size = batch_size(site)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        batches = bounded_map(executor, lambda batch: fetch_batch(site, batch), batched(titles, size),
+                              2 * max_workers)
+        for pages in batches:
+            yield from pages
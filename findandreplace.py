@@ -1,25 +1,26 @@
 import pywikibot
 from tqdm import tqdm
-import time
+from cache import WikitextCache
+from scheduler import EditScheduler
 
 
-def find_and_replace(site, page_title, mappings):
+def find_and_replace(site, wiki_page, mappings, scheduler):
+    page_title = wiki_page.title
     try:
-        page = pywikibot.Page(site, page_title)
-        if not page.exists():
+        if not wiki_page.exists:
             print(f"Page {page_title} does not exist.")
             return
 
-        text = page.text
+        text = wiki_page.text
         original_text = text[:]
 
         for phrase, replacement in mappings.items():
             text = text.replace(phrase, replacement)
 
         if text != original_text:
+            page = pywikibot.Page(site, page_title)
             page.text = text
-            page.save(summary="Fix file usage.", minor=True, tags="bot")
-            time.sleep(6)
+            scheduler.save(page, summary="Fix file usage.", minor=True, tags="bot")
 
     except Exception as e:
         print(f"An error occurred while processing {page_title}: {e}")
@@ -28,6 +29,7 @@ def find_and_replace(site, page_title, mappings):
 def main():
     site = pywikibot.Site()
     site.login()
+    scheduler = EditScheduler(site)
 
     mappings = {
         "File:REPLACED.png": "File:REPLACER.png",
@@ -36,10 +38,12 @@ def main():
     try:
         with open("search_results.txt", "r", encoding='utf-8') as file:
             pages = file.readlines()
-            pages = [page.strip() for page in pages]
+            pages = [page.strip() for page in pages if page.strip()]
 
-        for page_title in tqdm(pages, desc="Processing pages"):
-            find_and_replace(site, page_title, mappings)
+        cache = WikitextCache()
+        for wiki_page in tqdm(cache.fetch_pages(site, pages), total=len(pages), desc="Processing pages"):
+            find_and_replace(site, wiki_page, mappings, scheduler)
+        cache.close()
 
     except FileNotFoundError:
         print("search_results.txt file not found.")
@@ -1,168 +1,96 @@
+import argparse
 import pywikibot
-import time
 from tqdm import tqdm
-import concurrent.futures
-import queue
+from cache import WikitextCache
+from fetcher import fetch_batch
+from journal import Journal
+from pipeline import Spool
+from scheduler import EditScheduler
+from wikiformat import format_wikitext
+
+
+def check_page(page, spool, journal):
+    if page.exists:
+        text, made_changes = format_wikitext(page.text)
+        if made_changes:
+            spool.put(page.title, text, page.revid, page.timestamp)
+            journal.record('queued', page.title, page.revid)
+    journal.record('checked', page.title, page.revid)
+
+
+def submit_edit(site, title, text, revid, timestamp, scheduler):
+    request = site.simple_request(action='edit', title=title, text=text, summary="Automated Formatting", tags="bot",
+                                  bot=True, nocreate=True, baserevid=revid, basetimestamp=timestamp,
+                                  token=site.tokens['csrf'])
+    result = scheduler.submit(request)
+    if result['edit'].get('result') != 'Success':
+        # Captcha, AbuseFilter or spam blacklist: nothing was saved, so the page stays queued
+        raise pywikibot.exceptions.Error(f"Edit was not saved: {result['edit']}")
+    return result['edit'].get('newrevid', revid)
+
+
+def save_page(site, title, text, revid, timestamp, scheduler):
+    """Save text formatted from revision revid, refetching only on an edit conflict.
+
+    Returns the revid the page is left at.
+    """
+    try:
+        return submit_edit(site, title, text, revid, timestamp, scheduler)
+    except pywikibot.exceptions.APIError as e:
+        if e.code != 'editconflict':
+            raise
+
+    # Someone edited the page after it was checked, so format their revision instead
+    page = fetch_batch(site, [title])[0]
+    if not page.exists:
+        return None
+    text, made_changes = format_wikitext(page.text)
+    if not made_changes:
+        return page.revid
+    return submit_edit(site, title, text, page.revid, page.timestamp, scheduler)
 
-# Configure your site (e.g., 'en', 'wikipedia')
-site = pywikibot.Site()
-site.login()
 
+def main():
+    parser = argparse.ArgumentParser(description="Apply the standard formatting rules to every wiki page.")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue an interrupted run, skipping pages already checked or saved")
+    args = parser.parse_args()
 
-def process_page(page):
-    text = page.text
-    lines = text.split('\n')
-    made_changes = False
-    i = 0
-    in_codebox_section = False
-
-    while i < len(lines):
-        line = lines[i]
-
-        # Detect start of Codebox section
-        if line.startswith('{{Codebox'):
-            in_codebox_section = True
-
-        # Detect end of Codebox section
-        if in_codebox_section and line.startswith('==See also=='):
-            in_codebox_section = False
-
-        # If in Codebox section, skip processing
-        if in_codebox_section:
-            i += 1
-            continue
-
-        # Remove trailing whitespaces from the end of each line
-        original_line = lines[i]
-        cleaned_line = original_line.rstrip()
-        lines[i] = cleaned_line
-
-        # Check if this operation actually changed the line
-        if cleaned_line != original_line:
-            made_changes = True
-
-        # Check for Infobox start
-        if line.startswith('{{Infobox'):
-            j = i + 1
-            while j < len(lines) and not lines[j].startswith('}}'):
-                j += 1
-            if j < len(lines) and lines[j].startswith('}}'):
-                # Remove empty lines immediately after '}}' until a non-empty line is found
-                k = j + 1
-                while k < len(lines) and lines[k].strip() == '':
-                    lines.pop(k)  # Do not increment k, since pop shifts subsequent items left
-                    made_changes = True
-            i = j + 1  # Move index past the Infobox section
-            continue
-
-        # Check for second-level section header (== Header ==)
-        if line.startswith('==') and not line.startswith('==='):
-            # Ensure there is a blank line before the header if there isn't one already
-            if i > 0 and lines[i - 1].strip():
-                lines.insert(i, '')
-                made_changes = True
-                i += 1  # Adjust index for inserted line
-
-            # Ensure the line following the header is not empty
-            if i + 1 < len(lines):
-                j = i + 1
-                while j < len(lines) and lines[j].strip() == '':
-                    lines.pop(j)  # Remove the empty line
-                    made_changes = True
-                i = j - 1  # Adjust index to point to the header line
-
-        # Check for third-level section header (=== Subheader ===)
-        elif line.startswith('===') and not line.startswith('===='):
-            if i > 0:
-                prev_line = lines[i - 1].strip()
-
-                # If the line above starts with ==, do nothing
-                if prev_line.startswith('==') and not prev_line.startswith('==='):
-                    i += 1
-                    continue
-
-                # If the line above is empty, check the line above it
-                elif prev_line == '':
-                    if i > 1 and not lines[i - 2].strip():
-                        # Remove one of the empty lines if the one above the empty line is also empty
-                        lines.pop(i - 1)
-                        made_changes = True
-                        i -= 1  # Adjust index for removed line
-
-                # If the line above has text but does not start with ==, insert an empty line
-                elif not prev_line.startswith('=='):
-                    lines.insert(i, '')
-                    made_changes = True
-                    i += 1  # Adjust index for inserted line
-
-        # Check for Navbox
-        if line.startswith('{{Navbox'):
-            # Ensure there is a blank line before the Navbox if there isn't one already
-            if i > 0 and lines[i - 1].strip():
-                lines.insert(i, '')
-                made_changes = True
-                i += 1  # Adjust index for inserted line
-
-            # Ensure there is a blank line after the Navbox if there isn't one already
-            if i + 1 < len(lines) and lines[i + 1].strip():
-                lines.insert(i + 1, '')
-                made_changes = True
-
-        i += 1  # Normal increment of i
-
-    # Remove double empty lines
-    cleaned_lines = []
-    previous_line_empty = False
-    for line in lines:
-        if line.strip() == '':
-            if not previous_line_empty:
-                cleaned_lines.append(line)
-                previous_line_empty = True
-            else:
-                made_changes = True
-        else:
-            cleaned_lines.append(line)
-            previous_line_empty = False
-
-    if made_changes:
-        page.text = '\n'.join(cleaned_lines)
-        return True
-    return False
-
-
-def check_page(title, change_queue):
-    page = pywikibot.Page(site, title)
-    original_text = page.text
-    if process_page(page) and page.text != original_text:
-        change_queue.put(title)
-
+    # Configure your site (e.g., 'en', 'wikipedia')
+    site = pywikibot.Site()
+    site.login()
+    scheduler = EditScheduler(site)
 
-def main():
     with open('wiki_directory.txt', 'r', encoding='utf-8') as file:
-        titles = file.read().splitlines()
-
-    # Thread-safe queue for pages that need changes
-    change_queue = queue.Queue()
-
-    # Multithreaded check with tqdm progress bar
-    with concurrent.futures.ThreadPoolExecutor(max_workers=75) as executor:
-        futures = {executor.submit(check_page, title, change_queue): title for title in titles if title}
-        for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Checking pages"):
-            future.result()  # Ensure any exceptions are raised
-
-    # Convert queue to a list and sort alphabetically
-    pages_to_process = sorted(list(change_queue.queue))
-
-    # Single-threaded processing with rate limiting
-    for title in tqdm(pages_to_process, desc="Processing pages"):
-        page = pywikibot.Page(site, title)
-        if process_page(page):
-            try:
-                # Save the page with a summary
-                page.save(summary="Automated Formatting", tags="bot")
-                time.sleep(7)  # Adhere to rate limiting
-            except pywikibot.exceptions.Error as e:
-                print(f"Error saving page '{title}': {e}")
+        titles = [title for title in file.read().splitlines() if title]
+
+    # Every checked, queued and saved page is journaled so an interrupted run can pick up where it stopped
+    journal = Journal('formatting_journal.jsonl', resume=args.resume)
+    titles = [title for title in titles if not journal.has('checked', title)]
+
+    # Formatted texts are spooled to disk with the revision they were made from
+    spool = Spool('formatting_queue.sqlite3')
+    if not args.resume:
+        spool.clear()
+    cache = WikitextCache()
+
+    # Batched check with tqdm progress bar
+    for page in tqdm(cache.fetch_pages(site, titles), total=len(titles), desc="Checking pages"):
+        check_page(page, spool, journal)
+    cache.close()
+
+    # Single-threaded processing in alphabetical order, paced by the edit scheduler
+    for title in tqdm(spool.titles(), desc="Processing pages"):
+        revid, timestamp = spool.base(title)
+        try:
+            revid = save_page(site, title, spool.get(title), revid, timestamp, scheduler)
+        except pywikibot.exceptions.Error as e:
+            print(f"Error saving page '{title}': {e}")
+            continue
+        journal.record('saved', title, revid)
+        spool.remove(title)
+    spool.close()
+    journal.close()
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,7 @@
 import pywikibot
 from tqdm import tqdm
-import time
+from cache import WikitextCache
+from scheduler import EditScheduler
 
 # Mapping of files to be replaced
 item_mapping = {
@@ -8,15 +9,18 @@ item_mapping = {
 }
 
 
-def replace_file_usage_and_mark_deletion(site, old_file, new_file):
+def replace_file_usage_and_mark_deletion(site, old_file, new_file, scheduler):
     old_file_name = old_file.replace('File:', '')
     new_file_name = new_file.replace('File:', '')
 
     file_page = pywikibot.FilePage(site, old_file)
-    using_pages = list(file_page.using_pages())
+    using_titles = [page.title() for page in file_page.using_pages()]
 
-    for page in using_pages:
-        text = page.text
+    cache = WikitextCache()
+    for wiki_page in cache.fetch_pages(site, using_titles):
+        if not wiki_page.exists:
+            continue
+        text = wiki_page.text
         text2 = text
         # Check and replace all files in the mapping
         for ofn, nfn in item_mapping.items():
@@ -25,11 +29,12 @@ def replace_file_usage_and_mark_deletion(site, old_file, new_file):
             text = text.replace(ofn, nfn)
 
         if text2 != text:
+            page = pywikibot.Page(site, wiki_page.title)
             page.text = text
-            page.save(summary="Automatic file swap", minor=True, tags="bot")
-            time.sleep(6)
+            scheduler.save(page, summary="Automatic file swap", minor=True, tags="bot")
         else:
             pass
+    cache.close()
 
     # After all uses are replaced, check if the file is no longer in use and mark for deletion
     old_file_page = pywikibot.FilePage(site, old_file)
@@ -38,18 +43,18 @@ def replace_file_usage_and_mark_deletion(site, old_file, new_file):
         if "{{Delet" not in old_file_page.text:
             delete_notice = f"{{{{Delete|Duplicate, replaced by [[:{new_file}]]}}}}\n"
             old_file_page.text = delete_notice + old_file_page.text
-            old_file_page.save(summary="Marking duplicate file for deletion", minor=True, tags="bot")
-            time.sleep(6)
+            scheduler.save(old_file_page, summary="Marking duplicate file for deletion", minor=True, tags="bot")
 
 
 def main():
     site = pywikibot.Site()
     site.login()
+    scheduler = EditScheduler(site)
 
     # Iterate through each file replacement with a tqdm progress bar
     for old_file, new_file in tqdm(item_mapping.items(), desc="Processing files and marking for deletion",
                                    total=len(item_mapping)):
-        replace_file_usage_and_mark_deletion(site, old_file, new_file)
+        replace_file_usage_and_mark_deletion(site, old_file, new_file, scheduler)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,160 @@
+import re
+import sqlite3
+import zlib
+from array import array
+from collections import defaultdict
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return set(TOKEN_PATTERN.findall(text.lower()))
+
+
+def next_string(prefix):
+    """Smallest string greater than every string starting with prefix."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class SearchIndex:
+    """Persistent inverted token index over the pages in a WikitextCache.
+
+    Each lowercased \\w+ token maps to the sorted docids of the pages that
+    contain it. candidates() turns a literal search term into a small set of
+    titles that may contain it; the caller still verifies the text itself.
+    """
+
+    def __init__(self, path='search_index.sqlite3'):
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS docs ('
+                'docid INTEGER PRIMARY KEY, title TEXT UNIQUE NOT NULL, revid INTEGER NOT NULL, tokens BLOB NOT NULL)'
+            )
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS postings (token TEXT PRIMARY KEY, rtoken TEXT NOT NULL, docs BLOB NOT NULL)'
+            )
+            self.connection.execute('CREATE INDEX IF NOT EXISTS postings_rtoken ON postings (rtoken)')
+
+    def close(self):
+        self.connection.close()
+
+    def update(self, cache):
+        """Reindex pages whose cached revid changed and drop pages no longer cached.
+
+        Returns the number of pages (re)indexed.
+        """
+        indexed = {title: (docid, revid) for docid, title, revid in
+                   self.connection.execute('SELECT docid, title, revid FROM docs')}
+        cached = cache.revisions()
+        changed = [title for title, revid in cached.items() if indexed.get(title, (None, None))[1] != revid]
+        removed = [title for title in indexed if title not in cached]
+        if not changed and not removed:
+            return 0
+
+        next_docid = max((docid for docid, _ in indexed.values()), default=0) + 1
+        added = defaultdict(lambda: array('I'))
+        dropped = defaultdict(set)
+        doc_rows = []
+
+        def forget(docid):
+            blob, = self.connection.execute('SELECT tokens FROM docs WHERE docid = ?', (docid,)).fetchone()
+            for token in zlib.decompress(blob).decode('utf-8').split('\n'):
+                if token:
+                    dropped[token].add(docid)
+
+        for title in removed:
+            forget(indexed[title][0])
+        for title in changed:
+            page = cache.get(title, cached[title])
+            if page is None:
+                continue
+            if title in indexed:
+                docid = indexed[title][0]
+                forget(docid)
+            else:
+                docid = next_docid
+                next_docid += 1
+            tokens = tokenize(page.text)
+            for token in tokens:
+                added[token].append(docid)
+            doc_rows.append((docid, title, page.revid, zlib.compress('\n'.join(sorted(tokens)).encode('utf-8'))))
+
+        with self.connection:
+            self.connection.executemany('DELETE FROM docs WHERE title = ?', [(title,) for title in removed])
+            self.connection.executemany('INSERT OR REPLACE INTO docs VALUES (?, ?, ?, ?)', doc_rows)
+            for token in added.keys() | dropped.keys():
+                docs = set(self.postings(token))
+                docs -= dropped.get(token, set())
+                docs.update(added.get(token, ()))
+                if docs:
+                    self.connection.execute(
+                        'INSERT OR REPLACE INTO postings VALUES (?, ?, ?)',
+                        (token, token[::-1], zlib.compress(array('I', sorted(docs)).tobytes()))
+                    )
+                else:
+                    self.connection.execute('DELETE FROM postings WHERE token = ?', (token,))
+        return len(doc_rows)
+
+    def postings(self, token):
+        row = self.connection.execute('SELECT docs FROM postings WHERE token = ?', (token,)).fetchone()
+        return self._decode(row[0]) if row else array('I')
+
+    def _decode(self, blob):
+        docs = array('I')
+        docs.frombytes(zlib.decompress(blob))
+        return docs
+
+    def _union(self, rows):
+        docs = set()
+        for blob, in rows:
+            docs.update(self._decode(blob))
+        return docs
+
+    def _docs_for_token(self, token, open_left, open_right):
+        """Docids containing a token that may extend past the term on either side."""
+        if open_left and open_right:
+            rows = self.connection.execute('SELECT docs FROM postings WHERE instr(token, ?) > 0', (token,))
+        elif open_right:
+            rows = self.connection.execute('SELECT docs FROM postings WHERE token >= ? AND token < ?',
+                                           (token, next_string(token)))
+        elif open_left:
+            reverse = token[::-1]
+            rows = self.connection.execute('SELECT docs FROM postings WHERE rtoken >= ? AND rtoken < ?',
+                                           (reverse, next_string(reverse)))
+        else:
+            return set(self.postings(token))
+        return self._union(rows)
+
+    def candidate_docs(self, term):
+        """Docids of pages that may contain the literal term, or None if the index can't narrow it."""
+        term = term.lower()
+        spans = [match.span() for match in TOKEN_PATTERN.finditer(term)]
+        if not spans:
+            return None
+        docs = None
+        for position, (start, end) in enumerate(spans):
+            # A term can begin or end in the middle of a longer token in the page text
+            open_left = position == 0 and start == 0
+            open_right = position == len(spans) - 1 and end == len(term)
+            token_docs = self._docs_for_token(term[start:end], open_left, open_right)
+            docs = token_docs if docs is None else docs & token_docs
+            if not docs:
+                break
+        return docs
+
+    def candidates(self, terms):
+        """Titles of pages that may contain any of the terms, or None if a full scan is needed."""
+        docs = set()
+        for term in terms:
+            term_docs = self.candidate_docs(term)
+            if term_docs is None:
+                return None
+            docs |= term_docs
+        titles = []
+        docs = sorted(docs)
+        for start in range(0, len(docs), 500):
+            batch = docs[start:start + 500]
+            titles.extend(title for title, in self.connection.execute(
+                f"SELECT title FROM docs WHERE docid IN ({','.join('?' * len(batch))})", batch))
+        return titles
@@ -0,0 +1,120 @@
+import re
+
+# Parameter groups that repeat with a number: modelN, iconN, icon_nameN, weaponN, tagN.
+# (bases, numbers listed in SORT_ORDER, suffix used for the first one)
+NUMBERED_GROUPS = [
+    (("|model", "|icon", "|icon_name"), 21, ""),
+    (("|weapon",), 9, "1"),
+    (("|tag",), 5, ""),
+]
+
+
+def numbered(bases, count, first):
+    return [base + (first if number == 1 else str(number)) for number in range(1, count + 1) for base in bases]
+
+
+SORT_ORDER = [
+    "|name", *numbered(*NUMBERED_GROUPS[0]),
+    "|media_title",
+    "|category", "|weight", "|weight_full", "|weight_reduction", "|max_units",
+    "|equipped", "|attachment_type", "|function", "|primary_use", *numbered(*NUMBERED_GROUPS[1]),
+    "|part_type", "|skill_type", "|ammo_type", "|clip_size",
+    "|material", "|material_value", "|contents",
+    "|can_boil_water", "|consumed", "|writable", "|recipes", "|page_number", "|vol_number", "|packaged", "|rain_factor",
+    "|days_fresh", "|days_rotten",
+    "|cant_be_frozen", "|condition_max", "|condition_lower_chance", "|run_speed", "|combat_speed", "|scratch_defense",
+    "|bite_defense", "|bullet_defense",
+    "|neck_protection", "|insulation", "|wind_resistance", "|water_resistance", "|light_distance", "|light_strength",
+    "|torch_cone", "|wet_cooldown", "|sensor_range",
+    "|energy_source", "|two_way", "|mic_range", "|transmit_range", "|min_channel", "|max_channel", "|damage_type",
+    "|min_damage", "|max_damage", "|door_damage",
+    "|tree_damage", "|min_range", "|max_range", "|min_range_mod", "|max_range_mod", "|hit_chance", "|recoil_delay",
+    "|sound_radius", "|base_speed", "|swing_time", "|push_back", "|knockdown",
+    "|aiming_time", "|aiming_mod", "|reload_time", "|crit_chance", "|crit_multiplier", "|angle_mod", "|kill_move",
+    "|weight_mod", "|reload_mod",
+    "|aiming_change", "|reloading_change", "|effect_type", "|type", "|effect_power", "|effect_range",
+    "|effect_duration", "|effect_timer", "|hunger_change", "|thirst_change", "|calories", "|carbohydrates", "|proteins",
+    "|lipids", "|unhappy_change", "|boredom_change",
+    "|stress_change", "|panic_change", "|fatigue_change", "|endurance_change", "|flu_change", "|pain_change",
+    "|sick_change", "|alcoholic", "|alcohol_power",
+    "|reduce_infection_power", "|bandage_power", "|poison_power", "|cook_minutes", "|burn_minutes",
+    "|dangerous_uncooked", "|bad_microwaved", "|good_hot", "|bad_cold",
+    "|spice", "|evolved_recipe", "|workstation", "|tool", "|ingredients", *numbered(*NUMBERED_GROUPS[2]),
+    "|capacity", "|item_id", "|guid",
+    "|itemdisplayname", "|recmedia"
+]
+
+NUMBERED_KEY = re.compile(r'(\|[A-Za-z_]+)(\d*)$')
+UNKNOWN_RANK = (len(SORT_ORDER), 0, 0)
+MAX_RANKS = 4096
+
+
+def _group_index(ranks):
+    """base -> (position in its group, listed count, first suffix, index of the group's last key)"""
+    groups = {}
+    for bases, count, first in NUMBERED_GROUPS:
+        last = max(ranks[base + (first if count == 1 else str(count))][0] for base in bases)
+        for position, base in enumerate(bases):
+            groups[base] = (position, count, first, last)
+    return groups
+
+
+_ranks = {key: (index, 0, 0) for index, key in enumerate(SORT_ORDER)}
+_groups = _group_index(_ranks)
+
+
+def rank(key):
+    """Sort position of an infobox parameter name; unknown names sort last.
+
+    Numbered parameters past the ones listed in SORT_ORDER (|model22,
+    |weapon10, ...) go right after their group, ordered by number, and the
+    first of a group can be written with or without its 1.
+    """
+    found = _ranks.get(key)
+    if found is not None:
+        return found
+    match = NUMBERED_KEY.match(key)
+    group = _groups.get(match.group(1)) if match else None
+    number = int(match.group(2) or 1) if group else 0
+    if not number:
+        found = UNKNOWN_RANK
+    elif number <= group[1]:
+        found = _ranks[match.group(1) + (group[2] if number == 1 else str(number))]
+    else:
+        found = (group[3], number, group[0])
+    if len(_ranks) < MAX_RANKS:
+        _ranks[key] = found
+    return found
+
+
+def parse_parameter(line):
+    """(key, value) of a |key=value line, split at the first '=' only, or None for other lines."""
+    key, equals, value = line.partition('=')
+    if not equals:
+        return None
+    return key.strip(), value.strip()
+
+
+def parse_parameters(lines):
+    """Ordered dict of the parameters in the given infobox lines; later duplicates win."""
+    parameters = {}
+    for line in lines:
+        parameter = parse_parameter(line)
+        if parameter is not None:
+            parameters[parameter[0]] = parameter[1]
+    return parameters
+
+
+def line_rank(line):
+    return rank(line.partition('=')[0].strip())
+
+
+def sort_infobox(infobox):
+    infobox_lines = infobox.split('\n')[1:-1]  # Exclude the first '{{Infobox item' and the last '}}'
+    return '{{Infobox item\n' + '\n'.join(sorted(infobox_lines, key=line_rank)) + '\n}}'
+
+
+def serialize(parameters):
+    """Infobox item template for a dict of parameters, in SORT_ORDER and built with a single join."""
+    items = sorted(parameters.items(), key=lambda item: rank(item[0]))
+    return '{{Infobox item\n' + '\n'.join(f'{key}={value}' for key, value in items) + '\n}}'
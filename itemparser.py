@@ -0,0 +1,65 @@
+import re
+
+# `item Name`, optionally followed by the opening brace and/or a // or /* comment
+ITEM_HEADER = re.compile(r'\s*item\s+([^\s{}/]+)\s*(?:\{.*|//.*|/\*.*)?$')
+
+
+def scan_braces(line, in_comment):
+    """(depth change, opens a brace, still inside /* */) for one line, ignoring braces in comments."""
+    if not in_comment and '/' not in line:
+        return line.count('{') - line.count('}'), '{' in line, False
+    depth = 0
+    opens = False
+    position = 0
+    length = len(line)
+    while position < length:
+        if in_comment:
+            end = line.find('*/', position)
+            if end < 0:
+                break
+            in_comment = False
+            position = end + 2
+            continue
+        char = line[position]
+        if char == '{':
+            depth += 1
+            opens = True
+        elif char == '}':
+            depth -= 1
+        elif line.startswith('/*', position):
+            in_comment = True
+            position += 2
+            continue
+        elif line.startswith('//', position):
+            break
+        position += 1
+    return depth, opens, in_comment
+
+
+def iter_items(lines):
+    """Yield (name, line number, code) for every item block in a script file.
+
+    lines can be any iterable of lines, such as an open file, so a file is
+    read in a single streaming pass. A block runs from its `item Name` line
+    to the brace that closes it, counting nested blocks and skipping braces
+    inside // and /* */ comments. A block still open at the end of the file
+    runs to the end.
+    """
+    in_comment = False
+    name = None
+    for number, line in enumerate(lines, 1):
+        if name is None and not in_comment:
+            match = ITEM_HEADER.match(line)
+            if match:
+                name, start, block, depth, opened = match.group(1), number, [], 0, False
+        change, opens, in_comment = scan_braces(line, in_comment)
+        if name is None:
+            continue
+        block.append(line)
+        depth += change
+        opened = opened or opens
+        if opened and depth <= 0:
+            yield name, start, ''.join(block)
+            name = None
+    if name is not None:
+        yield name, start, ''.join(block)
@@ -0,0 +1,51 @@
+import json
+import os
+import threading
+
+STATES = ('checked', 'queued', 'saved')
+
+
+class Journal:
+    """Append-only checkpoint log of the titles a run has checked, queued and saved.
+
+    Each line is a JSON object with the state, title and revid, flushed as
+    soon as it is written. Opening with resume=True replays an existing
+    journal so the run can skip finished work; otherwise it starts empty.
+    """
+
+    def __init__(self, path, resume=False):
+        self.lock = threading.Lock()
+        self.entries = {state: {} for state in STATES}
+        if resume and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line from an interrupted write
+                    self.entries[entry['state']][entry['title']] = entry['revid']
+        self.file = open(path, 'a' if resume else 'w', encoding='utf-8')
+
+    def record(self, state, title, revid=None):
+        with self.lock:
+            self.file.write(json.dumps({'state': state, 'title': title, 'revid': revid}, ensure_ascii=False) + '\n')
+            self.file.flush()
+            self.entries[state][title] = revid
+
+    def has(self, state, title):
+        return title in self.entries[state]
+
+    def revid(self, state, title):
+        return self.entries[state].get(title)
+
+    def unsaved(self, title):
+        """Queued in an earlier attempt but not saved yet."""
+        return self.has('queued', title) and not self.has('saved', title)
+
+    def needs_check(self, title):
+        # Unsaved pages are checked again so edits made since they were queued are not overwritten
+        return not self.has('checked', title) or self.unsaved(title)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
@@ -0,0 +1,104 @@
+import re
+
+NEVER = '(?!)'
+
+
+def trie_pattern(terms):
+    """Build a regex alternation of literal terms with shared prefixes factored out.
+
+    The regex engine then walks the terms as a trie in a single pass over the
+    text instead of trying every term at every position, much like an
+    Aho-Corasick automaton.
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        ends_here = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and not ends_here:
+            return branches[0]
+        alternation = '(?:' + '|'.join(branches) + ')'
+        return alternation + '?' if ends_here else alternation
+
+    pattern = build(trie)
+    return pattern if trie else NEVER
+
+
+def is_word_char(text, index):
+    return 0 <= index < len(text) and (text[index].isalnum() or text[index] == '_')
+
+
+def whole_word(pattern):
+    return rf'(?<!\w)(?:{pattern})(?!\w)'
+
+
+class TermMatcher:
+    """Matches many search terms against page text, compiled once per search.
+
+    Terms are literal substrings unless regex is set. whole_words requires the
+    match to be bounded by non-word characters. Pages containing any of the
+    ignore patterns are reported as ignored.
+    """
+
+    def __init__(self, terms, case_sensitive=False, regex=False, whole_words=False, ignore=()):
+        self.case_sensitive = case_sensitive
+        self.regex = regex
+        self.whole_words = whole_words
+        flags = 0 if case_sensitive else re.IGNORECASE
+        terms = list(dict.fromkeys(term if case_sensitive or regex else term.lower() for term in terms if term))
+        self.terms = terms
+
+        if regex:
+            wrap = whole_word if whole_words else (lambda pattern: pattern)
+            self._term_patterns = [(term, re.compile(wrap(term), flags)) for term in terms]
+            ignore_pattern = '|'.join(f'(?:{pattern})' for pattern in ignore if pattern) or NEVER
+        else:
+            pattern = trie_pattern(terms)
+            if whole_words:
+                pattern = whole_word(pattern)
+            self._search = re.compile(pattern, flags).search
+            # Zero-width lookahead so overlapping matches at every position are reported
+            self._scan = re.compile(f'(?=({pattern}))', flags).finditer
+            # Every term is reported along with the terms that are prefixes of it
+            term_set = set(terms)
+            self._prefixes = {term: [term[:i] for i in range(1, len(term) + 1) if term[:i] in term_set]
+                              for term in terms}
+            ignore = [pattern if case_sensitive else pattern.lower() for pattern in ignore if pattern]
+            ignore_pattern = trie_pattern(ignore) if ignore else NEVER
+        self._ignore = re.compile(ignore_pattern, flags).search
+
+    def ignored(self, text):
+        return self._ignore(text) is not None
+
+    def matches(self, text):
+        if self.regex:
+            return any(pattern.search(text) for _, pattern in self._term_patterns)
+        return self._search(text) is not None
+
+    def _bounded(self, text, start, end):
+        return not is_word_char(text, start - 1) and not is_word_char(text, end)
+
+    def find(self, text):
+        """Return {term: [start offsets]} for every term found in the text."""
+        found = {}
+        if self.regex:
+            for term, pattern in self._term_patterns:
+                starts = [match.start() for match in pattern.finditer(text)]
+                if starts:
+                    found[term] = starts
+            return found
+        for match in self._scan(text):
+            start = match.start()
+            key = match.group(1) if self.case_sensitive else match.group(1).lower()
+            for term in self._prefixes.get(key, (key,)):
+                if self.whole_words and not self._bounded(text, start, start + len(term)):
+                    continue
+                found.setdefault(term, []).append(start)
+        return found
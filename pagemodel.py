@@ -0,0 +1,76 @@
+import re
+
+TEXT = 'text'
+BOT_FLAG = 'bot_flag'
+INFOBOX = 'infobox'
+CODESNIP = 'codesnip'
+
+BOT_FLAG_PATTERN = re.compile(r"<!--BOT FLAG\|([^|]+)\|([^|]+)-->(.*?)<!--END BOT FLAG\|\1\|\2-->", re.DOTALL)
+INFOBOX_PATTERN = re.compile(r'(\{\{Infobox item.*?\n)(.*?\n)*?(\}\})', re.DOTALL)
+CODESNIP_PATTERN = re.compile(r'{{CodeSnip(.*?)}}', re.DOTALL)
+
+
+class Segment:
+    """A run of page text; groups holds the regex groups that identified it."""
+    __slots__ = ('kind', 'text', 'groups')
+
+    def __init__(self, kind, text, groups=()):
+        self.kind = kind
+        self.text = text
+        self.groups = groups
+
+
+class PageModel:
+    """Wikitext split once into the parts updater rewrites.
+
+    The segments are, in page order, BOT FLAG regions, the first
+    {{Infobox item}}, CodeSnip blocks and the free text between them.
+    Transforms replace the text of individual segments, so an edit can never
+    land on an identical copy elsewhere on the page, and text() joins them
+    back together once at the end.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.edited = False
+        segments = self._split([Segment(TEXT, source)], BOT_FLAG_PATTERN, BOT_FLAG)
+        segments = self._split(segments, INFOBOX_PATTERN, INFOBOX, first_only=True)
+        self.segments = self._split(segments, CODESNIP_PATTERN, CODESNIP)
+        self.infobox = next((segment for segment in self.segments if segment.kind == INFOBOX), None)
+
+    @staticmethod
+    def _split(segments, pattern, kind, first_only=False):
+        result = []
+        found = False
+        for segment in segments:
+            if segment.kind != TEXT or (first_only and found):
+                result.append(segment)
+                continue
+            position = 0
+            for match in pattern.finditer(segment.text):
+                if match.start() > position:
+                    result.append(Segment(TEXT, segment.text[position:match.start()]))
+                result.append(Segment(kind, match.group(), match.groups()))
+                position = match.end()
+                found = True
+                if first_only:
+                    break
+            if position < len(segment.text):
+                result.append(Segment(TEXT, segment.text[position:]))
+        return result
+
+    def of_kind(self, kind):
+        return [segment for segment in self.segments if segment.kind == kind]
+
+    def replace(self, segment, text):
+        """Give a segment new text; returns False, leaving the page untouched, when the text is the same."""
+        if segment.text == text:
+            return False
+        segment.text = text
+        self.edited = True
+        return True
+
+    def text(self):
+        if not self.edited:
+            return self.source
+        return ''.join(segment.text for segment in self.segments)
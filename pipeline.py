@@ -0,0 +1,135 @@
+import queue
+import sqlite3
+import threading
+import zlib
+from concurrent.futures import FIRST_COMPLETED, as_completed, wait
+
+
+def bounded_map(executor, fn, items, max_in_flight):
+    """Yield fn(item) for every item as the calls complete, in completion order.
+
+    Unlike executor.map, items are submitted lazily and at most max_in_flight
+    calls are pending at once, so neither the input nor the finished results
+    pile up in memory when the consumer is slower than the workers.
+    """
+    pending = set()
+    for item in items:
+        if len(pending) >= max_in_flight:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+        pending.add(executor.submit(fn, item))
+    for future in as_completed(pending):
+        yield future.result()
+
+
+class SaveQueue:
+    """Single writer thread that saves pages while the caller keeps fetching and checking.
+
+    Items are saved one at a time in the order they are put, so the edit
+    scheduler still paces every save, but the first save goes out as soon as
+    the first page is ready. put() only blocks once max_pending items are
+    waiting (0 means no limit). close() waits for the queue to drain and
+    re-raises the first exception save raised; later items are dropped.
+    """
+
+    _DONE = object()
+
+    def __init__(self, save, max_pending=0):
+        self.save = save
+        self.queue = queue.Queue(max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is self._DONE:
+                return
+            if self.error is None:
+                try:
+                    self.save(item)
+                except BaseException as e:
+                    self.error = e
+
+    def put(self, item):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(item)
+
+    def close(self):
+        self.queue.put(self._DONE)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+class ResultWriter:
+    """Append lines to a results file as they are found and sort it on close.
+
+    Every line is flushed immediately, so results found before a crash are
+    kept on disk.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def write(self, line):
+        self.file.write(f"{line}\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+        with open(self.path, 'r', encoding='utf-8') as file:
+            lines = sorted({line.strip() for line in file if line.strip()})
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.writelines(f"{line}\n" for line in lines)
+
+
+class Spool:
+    """On-disk queue of page texts waiting to be saved, keyed by title.
+
+    Each text can carry the revid and timestamp of the revision it was made
+    from, so the save can be checked for edit conflicts.
+    """
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS spool (title TEXT PRIMARY KEY, text BLOB NOT NULL, '
+                                    'revid INTEGER, timestamp TEXT)')
+
+    def put(self, title, text, revid=None, timestamp=None):
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO spool (title, text, revid, timestamp) VALUES (?, ?, ?, ?)',
+                                    (title, zlib.compress(text.encode('utf-8')), revid, timestamp))
+
+    def get(self, title):
+        with self.lock:
+            row = self.connection.execute('SELECT text FROM spool WHERE title = ?', (title,)).fetchone()
+        return zlib.decompress(row[0]).decode('utf-8') if row else None
+
+    def base(self, title):
+        """(revid, timestamp) of the revision the spooled text was made from."""
+        with self.lock:
+            row = self.connection.execute('SELECT revid, timestamp FROM spool WHERE title = ?', (title,)).fetchone()
+        return tuple(row) if row else (None, None)
+
+    def remove(self, title):
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM spool WHERE title = ?', (title,))
+
+    def titles(self):
+        with self.lock:
+            return [title for title, in self.connection.execute('SELECT title FROM spool ORDER BY title')]
+
+    def clear(self):
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM spool')
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
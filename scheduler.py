@@ -0,0 +1,142 @@
+import contextlib
+import threading
+import time
+import pywikibot
+
+
+class EditScheduler:
+    """Token bucket that paces saves to what the wiki can take right now.
+
+    The fastest allowed rate comes from the account's edit ratelimit in
+    userinfo (accounts with noratelimit use min_interval instead). The
+    interval between saves shrinks towards that floor after every healthy
+    save and doubles when the wiki reports replication lag, a ratelimit or a
+    Retry-After, or when a save was slowed down by pywikibot's own maxlag
+    retries.
+    """
+
+    def __init__(self, site, start_interval=6.0, min_interval=1.0, max_interval=120.0, burst=3,
+                 probe_every=30.0, slow_save=15.0):
+        self.site = site
+        self.lock = threading.Lock()
+        self.saving = 0
+        self.writedelay = None
+
+        hits, seconds = self._edit_ratelimit()
+        if hits:
+            self.capacity = max(1, min(burst, hits))
+            # A full bucket plus the refill must fit in the server's window
+            floor = seconds / (hits - self.capacity + 1)
+        else:
+            self.capacity = burst
+            floor = 0.0
+        self.floor = max(min_interval, floor)
+        self.max_interval = max(max_interval, self.floor)
+        self.interval = min(max(start_interval, self.floor), self.max_interval)
+        # Older pywikibot releases call write_maxlag just maxlag
+        self.max_lag = getattr(pywikibot.config, 'write_maxlag', None) or getattr(pywikibot.config, 'maxlag', 5)
+        self.probe_every = probe_every
+        self.slow_save = slow_save
+
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.not_before = 0.0
+        self.last_probe = None
+        self.started = None
+
+    def _edit_ratelimit(self):
+        """Most restrictive (hits, seconds) edit limit of the account, or (0, 0) if none applies."""
+        limits = self.site.userinfo.get('ratelimits', {}).get('edit', {})
+        limits = [(limit['hits'], limit['seconds']) for limit in limits.values() if limit.get('hits')]
+        return max(limits, key=lambda limit: limit[1] / limit[0], default=(0, 0))
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+        self.updated = now
+
+    def _probe(self):
+        """Check replication lag every probe_every seconds and back off if the wiki is behind."""
+        now = time.monotonic()
+        if self.last_probe is not None and now - self.last_probe < self.probe_every:
+            return
+        self.last_probe = now
+        try:
+            reply = self.site.simple_request(action='query', meta='siteinfo', siprop='dbrepllag').submit()
+            lag = max(float(server['lag']) for server in reply['query']['dbrepllag'])
+        except (pywikibot.exceptions.Error, KeyError, ValueError):
+            return
+        if lag >= self.max_lag / 2:
+            self.back_off(lag)
+
+    def back_off(self, wait=0.0):
+        with self.lock:
+            self.interval = min(self.max_interval, self.interval * 2)
+            self.tokens = min(self.tokens, 0.0)
+            self.not_before = max(self.not_before, time.monotonic() + wait)
+
+    def speed_up(self):
+        with self.lock:
+            self.interval = max(self.floor, self.interval * 0.75)
+
+    def wait(self):
+        """Block until the next save may go out."""
+        self._probe()
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            delay = max(self.not_before - now, (1 - self.tokens) * self.interval, 0)
+        if delay:
+            time.sleep(delay)  # Without the lock, so back_off and done are not held up
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            self.started = time.monotonic()
+
+    def done(self, error=None):
+        """Report how the save after the last wait() went."""
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        # Page saves wrap the APIError in an OtherPageSaveError
+        code = getattr(getattr(error, 'reason', error), 'code', None)
+        if code in ('maxlag', 'ratelimited') or elapsed > self.slow_save:
+            self.back_off(max(self.site.throttle.retry_after or 0, 0))
+        elif error is None:
+            self.speed_up()
+
+    @contextlib.contextmanager
+    def _paced(self):
+        """Turn pywikibot's fixed write delay off while a save paced by this schedule is running."""
+        throttle = self.site.throttle
+        with self.lock:
+            if not self.saving:
+                self.writedelay, throttle.writedelay = throttle.writedelay, 0
+            self.saving += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.saving -= 1
+                if not self.saving:
+                    throttle.writedelay = self.writedelay
+
+    def save(self, page, **kwargs):
+        """page.save(**kwargs), paced by the schedule."""
+        self.wait()
+        try:
+            with self._paced():
+                page.save(**kwargs)
+        except Exception as e:
+            self.done(e)
+            raise
+        self.done()
+
+    def submit(self, request):
+        """Submit a write API request, paced by the schedule, and return its result."""
+        self.wait()
+        try:
+            with self._paced():
+                result = request.submit()
+        except Exception as e:
+            self.done(e)
+            raise
+        self.done()
+        return result
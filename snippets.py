@@ -0,0 +1,110 @@
+import json
+import sqlite3
+import threading
+
+
+def diff_snapshots(old, new):
+    """(added, changed, removed) item names between two {name: hash} snapshots."""
+    added = new.keys() - old.keys()
+    removed = old.keys() - new.keys()
+    changed = {name for name in new.keys() & old.keys() if new[name] != old[name]}
+    return added, changed, removed
+
+
+class SnippetStore:
+    """CodeSnip texts generated by codebox.py, kept in one SQLite file keyed by item name.
+
+    Replaces the one-file-per-item ./output directory. put_many writes a
+    whole regeneration in a single transaction and leaves unchanged rows
+    alone; load reads every snippet into a dict so lookups never touch the
+    disk.
+
+    The same file keeps a content hash of every item for each game version
+    parsed, and the items each wiki page was last seen using, so a wiki run
+    can be limited to the pages whose items changed between two versions.
+    A manifest of the resource files parsed (mtime, size, content hash and
+    the items each produced) lets a regeneration skip unchanged files.
+    """
+
+    def __init__(self, path='snippets.sqlite3'):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS snippets (name TEXT PRIMARY KEY, text TEXT NOT NULL)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS snapshots (version TEXT NOT NULL, name TEXT NOT NULL, '
+                                    'hash TEXT NOT NULL, PRIMARY KEY (version, name))')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS pages (title TEXT PRIMARY KEY, items TEXT NOT NULL)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, '
+                                    'size INTEGER NOT NULL, hash TEXT NOT NULL, version TEXT NOT NULL, '
+                                    'items TEXT NOT NULL)')
+
+    def put_many(self, snippets):
+        """Store (name, text) pairs; returns how many were new or changed."""
+        with self.lock, self.connection:
+            before = self.connection.total_changes
+            self.connection.executemany(
+                'INSERT INTO snippets (name, text) VALUES (?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET text = excluded.text WHERE text != excluded.text', snippets
+            )
+            return self.connection.total_changes - before
+
+    def remove(self, names):
+        with self.lock, self.connection:
+            self.connection.executemany('DELETE FROM snippets WHERE name = ?', [(name,) for name in names])
+
+    def get(self, name):
+        with self.lock:
+            row = self.connection.execute('SELECT text FROM snippets WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def names(self):
+        """Set of every stored snippet name."""
+        with self.lock:
+            return {row[0] for row in self.connection.execute('SELECT name FROM snippets')}
+
+    def load(self):
+        """{name: text} for every stored snippet."""
+        with self.lock:
+            return dict(self.connection.execute('SELECT name, text FROM snippets'))
+
+    def put_snapshot(self, version, hashes):
+        """Replace the {name: hash} snapshot of a game version."""
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM snapshots WHERE version = ?', (version,))
+            self.connection.executemany('INSERT INTO snapshots (version, name, hash) VALUES (?, ?, ?)',
+                                        [(version, name, digest) for name, digest in hashes.items()])
+
+    def snapshot(self, version):
+        """{name: hash} of the items parsed for a game version; empty if it was never parsed."""
+        with self.lock:
+            return dict(self.connection.execute('SELECT name, hash FROM snapshots WHERE version = ?', (version,)))
+
+    def manifest(self):
+        """{path: (mtime_ns, size, hash, version, [(name, item hash), ...])} for every resource file parsed."""
+        with self.lock:
+            rows = self.connection.execute('SELECT path, mtime_ns, size, hash, version, items FROM files').fetchall()
+        return {row[0]: (row[1], row[2], row[3], row[4], [tuple(item) for item in json.loads(row[5])])
+                for row in rows}
+
+    def update_manifest(self, entries, removed=()):
+        """Store (path, mtime_ns, size, hash, version, items) entries and drop the removed paths."""
+        with self.lock, self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)',
+                                        [(*entry[:5], json.dumps(entry[5])) for entry in entries])
+            self.connection.executemany('DELETE FROM files WHERE path = ?', [(path,) for path in removed])
+
+    def record_page(self, title, items):
+        """Remember which items the CodeSnips on a wiki page show."""
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO pages (title, items) VALUES (?, ?)',
+                                    (title, '\n'.join(sorted(items))))
+
+    def pages(self):
+        """{title: frozenset of item names} for every page recorded so far."""
+        with self.lock:
+            rows = self.connection.execute('SELECT title, items FROM pages').fetchall()
+        return {title: frozenset(filter(None, items.split('\n'))) for title, items in rows}
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
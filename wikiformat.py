@@ -0,0 +1,85 @@
+def format_wikitext(text):
+    """Apply the wiki's layout rules to a page in a single pass over its lines.
+
+    Trailing whitespace is stripped, blank lines after an Infobox and a
+    == header == are removed, headers and Navboxes get blank lines around
+    them and runs of blank lines are collapsed. Everything from {{Codebox
+    up to ==See also== is left alone. Returns (text, changed), with the
+    original text when nothing changed.
+    """
+    lines = text.split('\n')
+    count = len(lines)
+    out = []
+    i = 0
+    in_codebox_section = False
+
+    while i < count:
+        line = lines[i]
+        i += 1
+
+        if line.startswith('{{Codebox'):
+            in_codebox_section = True
+        if in_codebox_section and line.startswith('==See also=='):
+            in_codebox_section = False
+        if in_codebox_section:
+            out.append(line)
+            continue
+
+        line = line.rstrip()
+
+        if line.startswith('{{Infobox'):
+            # The body and the closing }} are kept as they are, blank lines after it are dropped
+            end = i
+            while end < count and not lines[end].startswith('}}'):
+                end += 1
+            out.append(line)
+            out.extend(lines[i:end + 1])
+            i = end + 1
+            while i < count and lines[i].strip() == '':
+                i += 1
+            continue
+
+        if line.startswith('==') and not line.startswith('==='):
+            if out and out[-1].strip():
+                out.append('')
+            out.append(line)
+            while i < count and lines[i].strip() == '':
+                i += 1
+            continue
+
+        if line.startswith('===') and not line.startswith('===='):
+            if out:
+                previous = out[-1].strip()
+                if previous.startswith('==') and not previous.startswith('==='):
+                    pass
+                elif previous == '':
+                    if len(out) > 1 and not out[-2].strip():
+                        out.pop()
+                elif not previous.startswith('=='):
+                    out.append('')
+            out.append(line)
+            continue
+
+        if line.startswith('{{Navbox'):
+            if out and out[-1].strip():
+                out.append('')
+            out.append(line)
+            if i < count and lines[i].strip():
+                out.append('')
+            continue
+
+        out.append(line)
+
+    # Collapse runs of blank lines into the first one
+    cleaned_lines = []
+    previous_line_empty = False
+    for line in out:
+        empty = line.strip() == ''
+        if not (empty and previous_line_empty):
+            cleaned_lines.append(line)
+        previous_line_empty = empty
+
+    formatted = '\n'.join(cleaned_lines)
+    if formatted == text:
+        return text, False
+    return formatted, True